@@ -8,11 +8,32 @@ config.read(Path(__file__).parent / "utils" / "config.ini")
 
 input_folder = config.get("parquet", "input_folder")
 output_file = config.get("parquet", "output_file")
+mode = config.get("parquet", "mode", fallback="streaming")
+compression = config.get("parquet", "compression", fallback="zstd")
+row_group_size = config.get("parquet", "row_group_size", fallback="")
+statistics = config.get("parquet", "statistics", fallback="true").strip().lower()
+statistics_columns = config.get("parquet", "statistics_columns", fallback="")
+
+# statistics admite true/false, "full" o la lista de estadísticas que se escriben
+if statistics in ("true", "false"):
+    statistics = statistics == "true"
+elif statistics != "full":
+    kinds = {kind.strip() for kind in statistics.split(",")}
+    statistics = {kind: kind in kinds for kind in ("min", "max", "distinct_count", "null_count")}
 
 # Convertir a rutas absolutas basadas en cwd
 input_path = Path.cwd() / input_folder
 output_path = Path.cwd() / output_file
 
-# Ejecutar
-merger = ParquetMerger(input_folder=input_path, output_file=output_path)
-df = merger.merge()
+# Ejecutar en modo streaming (la memoria no depende del tamaño total del dataset)
+# o incremental (solo se procesan los archivos nuevos o modificados)
+# o particionado por año/mes de recogida
+merger = ParquetMerger(
+    input_folder=input_path,
+    output_file=output_path,
+    compression=compression,
+    row_group_size=int(row_group_size) if row_group_size else None,
+    statistics=statistics,
+    statistics_columns=[col.strip() for col in statistics_columns.split(",") if col.strip()] or None,
+)
+merger.merge(streaming=True, incremental=(mode == "incremental"), partitioned=(mode == "partitioned"))
@@ -0,0 +1,92 @@
+"""
+Benchmark de los índices secundarios de taxi_trips (pickup_datetime, pickup_location_id,
+payment_type): tiempo de la carga masiva manteniéndolos fila a fila frente a diferirlos
+(deferred_indexes) y reconstruirlos al final, y latencia de consultas analíticas con y
+sin ellos.
+
+Uso: python -m etl_example.bench_indexes
+"""
+import logging
+import statistics
+import tempfile
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+import polars as pl
+from sqlalchemy import text
+
+from etl_example.bench_load import synthetic_records
+from etl_example.database import deferred_indexes, dispose_engines, init_db, secondary_indexes, sqlite_load_profile
+from etl_example.etl_dag import _load_batch_bulk, with_row_hash
+
+QUERIES = {
+    "viajes en un día": "SELECT count(*) FROM taxi_trips "
+                        "WHERE pickup_datetime >= '2024-01-10' AND pickup_datetime < '2024-01-11'",
+    "importe medio por zona": "SELECT avg(total_amount) FROM taxi_trips WHERE pickup_location_id = 132",
+    "viajes por tipo de pago": "SELECT count(*) FROM taxi_trips WHERE payment_type = 3",
+}
+
+
+def synthetic_frame(n_rows: int, seed: int = 0) -> pl.DataFrame:
+    # synthetic_records usa un único tipo de pago: se reparte entre 1 y 4
+    rng = np.random.default_rng(seed)
+    frame = pl.from_dicts(synthetic_records(n_rows, seed), infer_schema_length=None)
+    return with_row_hash(frame.with_columns(pl.Series("payment_type", rng.integers(1, 5, n_rows))))
+
+
+def _query_latency(engine, repeat: int = 5) -> Dict[str, float]:
+    latencies = {}
+    with engine.connect() as connection:
+        for name, query in QUERIES.items():
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                connection.execute(text(query)).scalar()
+                times.append(time.perf_counter() - start)
+            latencies[name] = statistics.median(times)
+    return latencies
+
+
+def _load(frame: pl.DataFrame, batch_size: int, defer: bool) -> Tuple[float, float, Dict[str, float], Dict[str, float]]:
+    """Devuelve (segundos de carga, segundos de reconstrucción, latencias con índices, sin índices)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_uri = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        engine = init_db(db_uri)
+
+        start = time.perf_counter()
+        with sqlite_load_profile(db_uri), (deferred_indexes(db_uri) if defer else nullcontext()):
+            for i in range(0, frame.height, batch_size):
+                with engine.begin() as connection:
+                    _load_batch_bulk(connection, frame.slice(i, batch_size), upsert=True)
+            loaded = time.perf_counter()
+        rebuilt = time.perf_counter()
+
+        indexed = _query_latency(engine)
+        with engine.begin() as connection:
+            for index in secondary_indexes():
+                index.drop(connection)
+        unindexed = _query_latency(engine)
+        dispose_engines()
+        return loaded - start, rebuilt - loaded, indexed, unindexed
+
+
+def main(n_rows: int = 500_000, batch_size: int = 100_000):
+    logging.disable(logging.CRITICAL)
+    frame = synthetic_frame(n_rows)
+
+    kept, _, _, _ = _load(frame, batch_size, defer=False)
+    deferred, rebuild, indexed, unindexed = _load(frame, batch_size, defer=True)
+    print(f"Carga de {n_rows} filas en lotes de {batch_size}")
+    print(f"  índices mantenidos:   {kept:7.2f} s")
+    print(f"  índices diferidos:    {deferred + rebuild:7.2f} s (carga {deferred:.2f} s + reconstrucción {rebuild:.2f} s)")
+
+    print(f"{'consulta':<25} {'con índices (ms)':>17} {'sin índices (ms)':>17}")
+    for name in QUERIES:
+        print(f"{name:<25} {indexed[name] * 1000:>17.2f} {unindexed[name] * 1000:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
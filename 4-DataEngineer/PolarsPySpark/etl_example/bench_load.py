@@ -0,0 +1,97 @@
+"""
+Benchmark de la carga en SQLite: lotes ORM (_load_batch) frente al INSERT de Core
+ejecutado con executemany del driver (_load_batch_bulk).
+
+Cada cargador escribe los mismos registros sintéticos en una base de datos temporal:
+el ORM como dicts y la carga masiva como DataFrame, que es lo que recibe del DAG. La
+carga masiva se mide con el perfil durable de SQLite y con el perfil de carga
+(sqlite_load_profile).
+
+Uso: python -m etl_example.bench_load
+"""
+import logging
+import tempfile
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import polars as pl
+from sqlalchemy import func, select
+
+from etl_example.database import TaxiTripRecord, dispose_engines, init_db, session_scope, sqlite_load_profile
+from etl_example.etl_dag import _load_batch, _load_batch_bulk
+
+
+def synthetic_records(n_rows: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 1, 1)
+    pickup_offsets = rng.integers(0, 30 * 24 * 3600, n_rows)
+    durations = rng.integers(60, 3600, n_rows)
+    locations = rng.integers(1, 266, (n_rows, 2))
+    amounts = rng.uniform(0, 80, (n_rows, 6)).round(2)
+    return [
+        {
+            "vendor_id": 1 + i % 2,
+            "pickup_datetime": start + timedelta(seconds=int(pickup_offsets[i])),
+            "dropoff_datetime": start + timedelta(seconds=int(pickup_offsets[i] + durations[i])),
+            "pickup_location_id": int(locations[i, 0]),
+            "dropoff_location_id": int(locations[i, 1]),
+            "passenger_count": float(1 + i % 4),
+            "trip_distance": float(amounts[i, 0] / 10),
+            "fare_amount": float(amounts[i, 1]),
+            "extra": float(amounts[i, 2] / 40),
+            "mta_tax": 0.5,
+            "tip_amount": float(amounts[i, 3] / 5),
+            "tolls_amount": 0.0,
+            "improvement_surcharge": 1.0,
+            "total_amount": float(amounts[i, 1] + amounts[i, 4] / 4),
+            "congestion_surcharge": 2.5,
+            "airport_fee": None,
+            "payment_type": 1,
+        }
+        for i in range(n_rows)
+    ]
+
+
+def _load(method: str, records: List[Dict[str, Any]], batch_size: int) -> float:
+    frame = pl.from_dicts(records, infer_schema_length=None)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_uri = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        engine = init_db(db_uri)
+        profile = sqlite_load_profile(db_uri) if method == "bulk_profile" else nullcontext()
+
+        start = time.perf_counter()
+        with profile, session_scope(db_uri) as session:
+            for i in range(0, len(records), batch_size):
+                if method == "orm":
+                    _load_batch(session, records[i:i + batch_size])
+                else:
+                    with engine.begin() as connection:
+                        _load_batch_bulk(connection, frame.slice(i, batch_size))
+        elapsed = time.perf_counter() - start
+
+        with session_scope(db_uri) as session:
+            count = session.execute(select(func.count()).select_from(TaxiTripRecord)).scalar_one()
+        assert count == len(records), f"{method}: {count} filas cargadas de {len(records)}"
+        dispose_engines()
+        return elapsed
+
+
+def main(sizes=(10_000, 100_000), batch_sizes=(1_000, 100_000)):
+    logging.disable(logging.CRITICAL)
+    print(f"{'filas':>8} {'lote':>7} {'orm filas/s':>12} {'bulk filas/s':>13} {'bulk+perfil filas/s':>20} {'aceleración':>12}")
+    for n in sizes:
+        records = synthetic_records(n)
+        for batch_size in batch_sizes:
+            orm = _load("orm", records, batch_size)
+            bulk = _load("bulk", records, batch_size)
+            bulk_profile = _load("bulk_profile", records, batch_size)
+            print(f"{n:>8} {batch_size:>7} {n / orm:>12.0f} {n / bulk:>13.0f} {n / bulk_profile:>20.0f} "
+                  f"{orm / bulk_profile:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
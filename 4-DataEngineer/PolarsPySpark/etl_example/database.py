@@ -1,11 +1,24 @@
 """
 Configuración de la base de datos SQLite para el ETL de taxis de Nueva York
 """
-from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, create_engine
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+import polars as pl
+from sqlalchemy import (
+    Column, Integer, Float, String, DateTime, ForeignKey, Connection, Engine, Index, bindparam, create_engine, event,
+    func, insert, inspect, select, update
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm import Session, relationship, sessionmaker
 
-from etl_example.etl_config import DB_URI
+from etl_example.etl_config import (
+    DB_URI, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, SQLITE_PROFILES, DEFER_INDEXES_MIN_FRACTION
+)
 
 # Crear la base para los modelos SQLAlchemy
 Base = declarative_base()
@@ -31,12 +44,15 @@ class TaxiTripRecord(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     vendor_id = Column(Integer, nullable=False)
     
+    # Los índices no únicos (pickup_datetime, pickup_location_id, payment_type) son para
+    # las consultas analíticas: las cargas masivas los difieren (deferred_indexes)
+
     # Campos de tiempo
-    pickup_datetime = Column(DateTime, nullable=False)
+    pickup_datetime = Column(DateTime, nullable=False, index=True)
     dropoff_datetime = Column(DateTime, nullable=False)
     
     # Campos de ubicación con relaciones
-    pickup_location_id = Column(Integer, ForeignKey('locations.location_id'), nullable=False)
+    pickup_location_id = Column(Integer, ForeignKey('locations.location_id'), nullable=False, index=True)
     dropoff_location_id = Column(Integer, ForeignKey('locations.location_id'), nullable=False)
     
     # Relaciones
@@ -61,16 +77,300 @@ class TaxiTripRecord(Base):
     airport_fee = Column(Float)
     
     # Campos de pago
-    payment_type = Column(Integer, nullable=False)
+    payment_type = Column(Integer, nullable=False, index=True)
+
+    # Hash de la clave natural del viaje (NATURAL_KEY_COLUMNS): el índice único hace que
+    # recargar el mismo archivo no duplique viajes
+    row_hash = Column(String(32), index=True, unique=True)
+
+# Columnas que identifican un viaje, en el orden en que entran en row_hash
+NATURAL_KEY_COLUMNS = (
+    "vendor_id", "pickup_datetime", "dropoff_datetime", "pickup_location_id", "dropoff_location_id",
+    "fare_amount", "extra", "mta_tax", "tip_amount", "tolls_amount", "improvement_surcharge",
+    "total_amount", "congestion_surcharge", "airport_fee",
+)
+# Filas por lote al calcular row_hash de los viajes cargados antes de existir la columna
+ROW_HASH_BACKFILL_BATCH = 5000
+
+def _natural_key_part(name: str, dtype: pl.DataType) -> pl.Expr:
+    column = pl.col(name)
+    if dtype.is_temporal():
+        # Microsegundos desde la época, sea cual sea la unidad de tiempo de la columna
+        column = column.dt.epoch("us")
+    elif isinstance(TaxiTripRecord.__table__.c[name].type, Float):
+        # Importes en céntimos enteros: el texto de un float depende de cómo lo formatee Polars
+        column = (column.cast(pl.Float64) * 100).round().cast(pl.Int64, strict=False)
+    return column.cast(pl.String).fill_null("")
+
+def with_row_hash(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Añade la columna row_hash: BLAKE2b de 128 bits de las columnas NATURAL_KEY_COLUMNS.
+
+    Solo se hashean enteros: las fechas como microsegundos desde la época y los importes
+    como céntimos, así que el texto no depende de la versión de Polars ni de los tipos
+    del DataFrame y el mismo viaje produce el mismo hash en cualquier ejecución.
+    """
+    key_parts = [_natural_key_part(name, df.schema[name]) for name in NATURAL_KEY_COLUMNS]
+    return df.with_columns(
+        pl.concat_str(key_parts, separator="|")
+        .map_batches(lambda keys: pl.Series([hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+                                             for key in keys], dtype=pl.String),
+                     return_dtype=pl.String)
+        .alias(TaxiTripRecord.row_hash.key)
+    )
+
+# Un engine (con su pool de conexiones) y una fábrica de sesiones por URI, compartidos
+# por todos los lotes y ejecuciones del DAG del proceso
+_engines: Dict[str, Engine] = {}
+_session_factories: Dict[str, sessionmaker] = {}
+_initialized: Set[str] = set()
+# Cargas en curso por URI: mientras haya alguna, las conexiones usan el perfil "load"
+_active_loads: Dict[str, int] = {}
+# Cargas en curso por URI con los índices secundarios diferidos
+_deferred_loads: Dict[str, int] = {}
+_registry_lock = threading.Lock()
 
-def init_db():
-    """Inicializa la base de datos creando todas las tablas"""
-    engine = create_engine(DB_URI)
-    Base.metadata.create_all(engine)
+def _is_sqlite_file(db_uri: str) -> bool:
+    url = make_url(db_uri)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+def _apply_sqlite_profile(dbapi_connection, connection_record, db_uri: str) -> None:
+    profile = "load" if _active_loads.get(db_uri) else "durable"
+    if connection_record.info.get("sqlite_profile") == profile:
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PROFILES[profile].items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+    connection_record.info["sqlite_profile"] = profile
+
+def _register_sqlite_profile(engine: Engine, db_uri: str) -> None:
+    # Al conectar se aplica el perfil activo, y al sacar una conexión del pool se
+    # actualiza si el perfil ha cambiado desde que se configuró
+    event.listen(engine, "connect", lambda dbapi_connection, record: _apply_sqlite_profile(dbapi_connection, record, db_uri))
+    event.listen(engine, "checkout", lambda dbapi_connection, record, proxy: _apply_sqlite_profile(dbapi_connection, record, db_uri))
+
+def get_engine(db_uri: str = DB_URI) -> Engine:
+    """Devuelve el engine de db_uri, creándolo la primera vez"""
+    with _registry_lock:
+        engine = _engines.get(db_uri)
+        if engine is None:
+            options = {}
+            if make_url(db_uri).database not in (None, "", ":memory:"):
+                # Las bases de datos en memoria usan su propio pool de una conexión
+                options = dict(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                               pool_timeout=DB_POOL_TIMEOUT)
+            engine = create_engine(db_uri, **options)
+            if _is_sqlite_file(db_uri):
+                _register_sqlite_profile(engine, db_uri)
+            _engines[db_uri] = engine
+            _session_factories[db_uri] = sessionmaker(bind=engine)
+        return engine
+
+def init_db(db_uri: str = DB_URI) -> Engine:
+    """Inicializa la base de datos creando todas las tablas (solo la primera vez en el proceso)"""
+    engine = get_engine(db_uri)
+    with _registry_lock:
+        if db_uri not in _initialized:
+            Base.metadata.create_all(engine)
+            _add_missing_columns(engine)
+            _initialized.add(db_uri)
     return engine
 
-def get_session():
-    """Crea y devuelve una sesión de SQLAlchemy"""
-    engine = create_engine(DB_URI)
-    Session = sessionmaker(bind=engine)
-    return Session()
+def _add_missing_columns(engine: Engine) -> None:
+    # create_all no modifica tablas existentes: las columnas nuevas de los modelos (como
+    # row_hash) se añaden con ALTER TABLE y se crean sus índices
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+            if table is TaxiTripRecord.__table__ and TaxiTripRecord.row_hash.key not in existing:
+                _backfill_row_hash(connection)
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+def _backfill_row_hash(connection: Connection, batch_size: int = ROW_HASH_BACKFILL_BATCH) -> None:
+    # Sin row_hash, upsert volvería a insertar los viajes ya cargados: se calcula por
+    # lotes de id antes de crear el índice único. Si varias filas son el mismo viaje solo
+    # la primera recibe el hash y las demás quedan en NULL, como copias que ya eran
+    table = TaxiTripRecord.__table__
+    schema = {"id": pl.Int64}
+    for name in NATURAL_KEY_COLUMNS:
+        column_type = table.c[name].type
+        schema[name] = (pl.Datetime("us") if isinstance(column_type, DateTime)
+                        else pl.Float64 if isinstance(column_type, Float) else pl.Int64)
+    statement = (update(table).where(table.c.id == bindparam("trip_id"))
+                 .values(row_hash=bindparam("trip_hash")))
+
+    seen: Set[str] = set()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(*(table.c[name] for name in schema))
+            .where(table.c.id > last_id, table.c.row_hash.is_(None))
+            .order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        hashed = with_row_hash(pl.DataFrame(rows, schema=schema, orient="row"))
+        params = []
+        for trip_id, trip_hash in zip(hashed["id"], hashed[TaxiTripRecord.row_hash.key]):
+            if trip_hash not in seen:
+                seen.add(trip_hash)
+                params.append({"trip_id": trip_id, "trip_hash": trip_hash})
+        if params:
+            connection.execute(statement, params)
+
+def get_session(db_uri: str = DB_URI) -> Session:
+    """Crea y devuelve una sesión de SQLAlchemy sobre el engine compartido"""
+    get_engine(db_uri)
+    return _session_factories[db_uri]()
+
+@contextmanager
+def session_scope(db_uri: str = DB_URI) -> Iterator[Session]:
+    """Sesión que hace commit al salir del bloque, rollback si hay un error y siempre se cierra"""
+    session = get_session(db_uri)
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+@contextmanager
+def sqlite_load_profile(db_uri: str = DB_URI) -> Iterator[Engine]:
+    """
+    Aplica el perfil de carga de SQLITE_PROFILES mientras dura el bloque y restaura el
+    perfil durable al salir, con un checkpoint del WAL. Sin efecto en otras bases de datos.
+    """
+    engine = get_engine(db_uri)
+    if not _is_sqlite_file(db_uri):
+        yield engine
+        return
+
+    with _registry_lock:
+        _active_loads[db_uri] = _active_loads.get(db_uri, 0) + 1
+    try:
+        yield engine
+    finally:
+        with _registry_lock:
+            _active_loads[db_uri] -= 1
+            restore = _active_loads[db_uri] == 0
+        if restore:
+            # La conexión vuelve al perfil durable al sacarla del pool
+            with engine.connect() as connection:
+                connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+def secondary_indexes(table=TaxiTripRecord.__table__) -> List[Index]:
+    """Índices no únicos de la tabla: solo aceleran consultas y se pueden reconstruir"""
+    return [index for index in table.indexes if not index.unique]
+
+@contextmanager
+def deferred_indexes(db_uri: str = DB_URI, expected_rows: Optional[int] = None) -> Iterator[bool]:
+    """
+    Elimina los índices secundarios de taxi_trips mientras dura el bloque y los reconstruye
+    una sola vez al salir (también si falla la carga). Los índices únicos se mantienen
+    porque la carga los necesita (row_hash).
+
+    Si expected_rows es menor que DEFER_INDEXES_MIN_FRACTION de las filas de la tabla,
+    mantener los índices es más barato que reconstruirlos y no se hace nada. Devuelve si
+    los índices están diferidos.
+    """
+    engine = init_db(db_uri)
+    with _registry_lock:
+        deferring = _deferred_loads.get(db_uri, 0) > 0
+        if not deferring:
+            with engine.connect() as connection:
+                # max(id) estima el tamaño de la tabla sin recorrerla
+                table_rows = connection.execute(select(func.max(TaxiTripRecord.id))).scalar() or 0
+            deferring = expected_rows is None or expected_rows >= table_rows * DEFER_INDEXES_MIN_FRACTION
+            if deferring:
+                with engine.begin() as connection:
+                    for index in secondary_indexes():
+                        index.drop(connection, checkfirst=True)
+        if deferring:
+            _deferred_loads[db_uri] = _deferred_loads.get(db_uri, 0) + 1
+    try:
+        yield deferring
+    finally:
+        if deferring:
+            with _registry_lock:
+                _deferred_loads[db_uri] -= 1
+                rebuild = _deferred_loads[db_uri] == 0
+            if rebuild:
+                with engine.begin() as connection:
+                    for index in secondary_indexes():
+                        index.create(connection, checkfirst=True)
+
+# Ids de TaxiLocation que ya existen, por engine: se leen una vez por proceso
+_known_locations: Dict[Engine, Set[int]] = {}
+
+# Ids insertados en la transacción en curso de cada conexión, hasta su commit o rollback
+_PENDING_LOCATIONS = "pending_location_ids"
+
+def _forget_locations(connection: Connection) -> None:
+    # Solo las ubicaciones insertadas en la transacción deshecha pueden no existir
+    pending = connection.info.pop(_PENDING_LOCATIONS, None)
+    known = _known_locations.get(connection.engine)
+    if pending and known is not None:
+        known.difference_update(pending)
+
+def _confirm_locations(connection: Connection) -> None:
+    connection.info.pop(_PENDING_LOCATIONS, None)
+
+def insert_ignoring_conflicts(table, dialect_name: str):
+    """INSERT que omite las filas que violan una restricción única (SQLite y PostgreSQL)"""
+    if dialect_name == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing()
+    if dialect_name == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing()
+    return insert(table)
+
+def ensure_locations(connection: Connection, location_ids: Iterable[int]) -> int:
+    """
+    Crea, en la transacción de connection, las ubicaciones de location_ids que no existen.
+
+    Los ids conocidos se cachean en el proceso (se cargan de la tabla la primera vez), así
+    que solo se consulta la base de datos para insertar ids nuevos, con un único
+    INSERT ... ON CONFLICT DO NOTHING. Si la transacción se deshace, se olvidan solo los ids
+    que insertó.
+    Devuelve el número de ubicaciones nuevas.
+    """
+    engine = connection.engine
+    known = _known_locations.get(engine)
+    if known is None:
+        if not event.contains(engine, "rollback", _forget_locations):
+            event.listen(engine, "rollback", _forget_locations)
+            event.listen(engine, "commit", _confirm_locations)
+        known = set(connection.execute(select(TaxiLocation.location_id)).scalars())
+        _known_locations[engine] = known
+
+    missing = sorted(set(location_ids) - known)
+    if missing:
+        connection.execute(insert_ignoring_conflicts(TaxiLocation.__table__, connection.dialect.name), [
+            {"location_id": location_id, "borough": "Unknown",
+             "zone": f"Zone {location_id}", "service_zone": "Unknown"}
+            for location_id in missing
+        ])
+        known.update(missing)
+        connection.info.setdefault(_PENDING_LOCATIONS, set()).update(missing)
+    return len(missing)
+
+def dispose_engines() -> None:
+    """Cierra las conexiones de todos los engines y vacía el registro"""
+    with _registry_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _session_factories.clear()
+        _initialized.clear()
+        _active_loads.clear()
+        _deferred_loads.clear()
+        _known_locations.clear()
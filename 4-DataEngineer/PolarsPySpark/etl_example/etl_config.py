@@ -17,6 +17,33 @@ LOG_DIR.mkdir(exist_ok=True)
 # Configuración de la base de datos
 DB_PATH = OUTPUT_DIR / "nyc_taxi.db"
 DB_URI = f"sqlite:///{DB_PATH}"
+DB_POOL_SIZE = 5  # Conexiones que el pool mantiene abiertas
+DB_MAX_OVERFLOW = 10  # Conexiones extra permitidas en picos
+DB_POOL_TIMEOUT = 30  # Segundos de espera por una conexión libre
+
+# PRAGMAs de SQLite que se aplican a cada conexión. "durable" es el perfil normal;
+# "load" se usa durante las cargas masivas (sqlite_load_profile) y evita un fsync por
+# commit: con WAL y synchronous=NORMAL solo se sincroniza en los checkpoints
+SQLITE_PROFILES = {
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -2000,  # KiB (valor por defecto de SQLite)
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+    },
+    "load": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -256 * 1024,  # 256 MiB
+        "mmap_size": 1024 ** 3,
+        "temp_store": "MEMORY",
+    },
+}
+
+# Una carga elimina los índices secundarios y los reconstruye al final si añade al menos
+# esta fracción de las filas que ya tiene la tabla (ver database.deferred_indexes)
+DEFER_INDEXES_MIN_FRACTION = 0.25
 
 # Configuración de logging
 LOG_FILE = LOG_DIR / "etl_process.log"
@@ -27,5 +54,25 @@ LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 TAXI_DATA_FILE = DATA_DIR / "yellow_tripdata.parquet"
 TAXI_DATA_FILE_SMALL = DATA_DIR / "yellow_tripdata_small.parquet"
 
+# Configuración de la caché de resultados del DAG
+CACHE_DIR = OUTPUT_DIR / "cache"
+CACHE_MAX_BYTES = 5 * 1024 ** 3  # Tamaño máximo de la caché en disco (LRU)
+
+# Informes de métricas por ejecución (JSON y Chrome trace)
+REPORT_DIR = LOG_DIR / "reports"
+
+# Directorio con el estado y las salidas de cada ejecución del DAG (para reanudar)
+RUNS_DIR = OUTPUT_DIR / "runs"
+RUNS_KEEP_SUCCESSFUL = 0  # Ejecuciones con éxito cuyo directorio se conserva (las fallidas siempre)
+
+# Dataset de registros rechazados en la validación (run_id=.../reason=...)
+QUARANTINE_DIR = OUTPUT_DIR / "quarantine"
+
 # Configuración de procesamiento
 BATCH_SIZE = 100000  # Número de filas a procesar en cada lote
+VALIDATION_WORKERS = os.cpu_count() or 1  # Procesos de la validación sharded
+
+# Modo streaming: chunks del tamaño de los row groups del parquet (como máximo
+# STREAM_MAX_CHUNK_ROWS filas) y chunks en espera entre dos etapas
+STREAM_MAX_CHUNK_ROWS = 1024 * 1024
+STREAM_QUEUE_SIZE = 2
@@ -1,17 +1,41 @@
 """
 Implementación de ETL para taxis de Nueva York usando sistema de DAGs personalizado
 """
-from typing import List, Dict, Any
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from queue import Empty, Full, Queue
+from typing import Callable, Iterator, List, Dict, Any, Optional, Union
 import time
+from pathlib import Path
 
 import polars as pl
+import pyarrow.parquet
+from sqlalchemy import Connection, insert
 from sqlalchemy.orm import Session
 
-from etl_example.etl_config import TAXI_DATA_FILE_SMALL, BATCH_SIZE
+from etl_example.etl_config import (
+    TAXI_DATA_FILE_SMALL, BATCH_SIZE, CACHE_DIR, CACHE_MAX_BYTES, RUNS_DIR, RUNS_KEEP_SUCCESSFUL, REPORT_DIR,
+    STREAM_MAX_CHUNK_ROWS, STREAM_QUEUE_SIZE, VALIDATION_WORKERS
+)
 from etl_example.logger import setup_logger
 from etl_example.models import TaxiTrip
-from etl_example.database import init_db, get_session, TaxiTripRecord, TaxiLocation
-from utils import DAG
+from etl_example.validation import REASONS_COLUMN, model_schema, validate_frame, validate_records
+from etl_example.quarantine import write_quarantine
+from etl_example.database import (
+    init_db, deferred_indexes, ensure_locations, insert_ignoring_conflicts, session_scope, sqlite_load_profile,
+    with_row_hash, TaxiTripRecord
+)
+from utils import DAG, TaskCache, TaskOptions, RunReport
+from utils.checkpoint import new_run_id
+from utils.shared_frames import map_frames_in_process
+
+# Posición de cada fila en los datos transformados, para localizar los rechazados
+SOURCE_ROW_COLUMN = "source_row"
+
+# Formato de texto con el que el tipo DateTime de SQLAlchemy guarda las fechas en SQLite
+SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%6f"
 
 # Configurar el logger
 logger = setup_logger("nyc_taxi_etl")
@@ -19,43 +43,57 @@ logger = setup_logger("nyc_taxi_etl")
 # Crear el DAG
 taxi_dag = DAG(
     dag_id="nyc_taxi_etl",
-    description="ETL para procesar datos de taxis de Nueva York"
+    description="ETL para procesar datos de taxis de Nueva York",
+    checkpoint_dir=RUNS_DIR,
+    keep_successful_runs=RUNS_KEEP_SUCCESSFUL
 )
 
-def extract_taxi_data(file_path: str = str(TAXI_DATA_FILE_SMALL)) -> pl.DataFrame:
-    """Extrae los datos del archivo parquet utilizando Polars"""
+# Nombres de las columnas del parquet en nuestro modelo
+COLUMN_MAPPING = {
+    "VendorID": "vendor_id",
+    "tpep_pickup_datetime": "pickup_datetime",
+    "tpep_dropoff_datetime": "dropoff_datetime",
+    "PULocationID": "pickup_location_id",
+    "DOLocationID": "dropoff_location_id",
+    "passenger_count": "passenger_count",
+    "trip_distance": "trip_distance",
+    "fare_amount": "fare_amount",
+    "extra": "extra",
+    "mta_tax": "mta_tax",
+    "tip_amount": "tip_amount",
+    "tolls_amount": "tolls_amount",
+    "improvement_surcharge": "improvement_surcharge",
+    "total_amount": "total_amount",
+    "congestion_surcharge": "congestion_surcharge",
+    "Airport_fee": "airport_fee",
+    "payment_type": "payment_type"
+}
+
+def _model_columns(lf: pl.LazyFrame) -> pl.LazyFrame:
+    # Renombrar todas las columnas de una vez y leer solo las que usa el modelo
+    lf = lf.rename(COLUMN_MAPPING, strict=False)
+    available = set(lf.collect_schema().names())
+    return lf.select([col for col in TaxiTrip.model_fields if col in available])
+
+def extract_taxi_data(file_path: str = str(TAXI_DATA_FILE_SMALL),
+                      lazy: bool = False) -> Union[pl.DataFrame, pl.LazyFrame]:
+    """
+    Extrae los datos del archivo parquet utilizando Polars.
+
+    Con lazy=True devuelve un LazyFrame sin leer nada: los filtros de las etapas
+    siguientes se aplican en el propio lector de parquet, que descarta row groups
+    según sus estadísticas.
+    """
     logger.info(f"Extrayendo datos del archivo: {file_path}")
 
     try:
-        # Usar Polars para leer el archivo parquet
-        df = pl.read_parquet(file_path)
-
-        # Renombrar columnas para que coincidan con nuestro modelo
-        column_mapping = {
-            "VendorID": "vendor_id",
-            "tpep_pickup_datetime": "pickup_datetime",
-            "tpep_dropoff_datetime": "dropoff_datetime",
-            "PULocationID": "pickup_location_id",
-            "DOLocationID": "dropoff_location_id",
-            "passenger_count": "passenger_count",
-            "trip_distance": "trip_distance",
-            "fare_amount": "fare_amount",
-            "extra": "extra",
-            "mta_tax": "mta_tax",
-            "tip_amount": "tip_amount",
-            "tolls_amount": "tolls_amount",
-            "improvement_surcharge": "improvement_surcharge",
-            "total_amount": "total_amount",
-            "congestion_surcharge": "congestion_surcharge",
-            "Airport_fee": "airport_fee",
-            "payment_type": "payment_type"
-        }
-
-        # Renombrar columnas
-        for old_name, new_name in column_mapping.items():
-            if old_name in df.columns:
-                df = df.rename({old_name: new_name})
+        lf = _model_columns(pl.scan_parquet(file_path))
+
+        if lazy:
+            logger.info(f"Plan de extracción preparado. Columnas: {len(lf.collect_schema())}")
+            return lf
 
+        df = lf.collect()
         logger.info(f"Datos extraídos exitosamente. Filas: {df.shape[0]}, Columnas: {df.shape[1]}")
         return df
 
@@ -63,39 +101,45 @@ def extract_taxi_data(file_path: str = str(TAXI_DATA_FILE_SMALL)) -> pl.DataFram
         logger.error(f"Error al extraer datos: {str(e)}")
         raise
 
-def transform_taxi_data(df: pl.DataFrame) -> pl.DataFrame:
-    """Transforma los datos utilizando Polars"""
-    logger.info("Iniciando transformación de datos")
-
-    try:
-        # Filtrar viajes con distancia válida (mayor a 0)
-        df = df.filter(pl.col("trip_distance") > 0)
-
-        # Filtrar viajes con tarifa válida (mayor o igual a 0)
-        df = df.filter(pl.col("fare_amount") >= 0)
-
+def _transform_plan(lf: pl.LazyFrame) -> pl.LazyFrame:
+    return (
+        lf
         # Calcular la duración del viaje en minutos
-        df = df.with_columns([
+        .with_columns(
             ((pl.col("dropoff_datetime").dt.epoch() - pl.col("pickup_datetime").dt.epoch()) / 60).alias("trip_duration_minutes")
-        ])
-
-        # Filtrar viajes con duración válida (mayor a 0)
-        df = df.filter(pl.col("trip_duration_minutes") > 0)
-
+        )
         # Calcular la velocidad promedio (millas por hora)
-        df = df.with_columns([
+        .with_columns(
             (pl.col("trip_distance") / (pl.col("trip_duration_minutes") / 60)).alias("avg_speed_mph")
-        ])
-
-        # Filtrar velocidades razonables (menos de 100 mph)
-        df = df.filter(pl.col("avg_speed_mph") < 100)
-
+        )
+        # Distancia mayor a 0, tarifa no negativa, duración mayor a 0 y velocidad
+        # razonable (menos de 100 mph) en un único filtro
+        .filter(
+            (pl.col("trip_distance") > 0)
+            & (pl.col("fare_amount") >= 0)
+            & (pl.col("trip_duration_minutes") > 0)
+            & (pl.col("avg_speed_mph") < 100)
+        )
         # Manejar valores nulos
-        df = df.with_columns([
+        .with_columns(
             pl.col("passenger_count").fill_null(1),
             pl.col("congestion_surcharge").fill_null(0),
             pl.col("airport_fee").fill_null(0)
-        ])
+        )
+    )
+
+def transform_taxi_data(df: Union[pl.DataFrame, pl.LazyFrame]) -> pl.DataFrame:
+    """
+    Transforma los datos utilizando Polars (acepta también el LazyFrame de la extracción).
+
+    Todas las etapas forman un único plan perezoso que se ejecuta una sola vez con el
+    motor de streaming, sin materializar copias intermedias.
+    """
+    logger.info("Iniciando transformación de datos")
+
+    try:
+        lf = _transform_plan(df.lazy())
+        df = lf.collect(engine="streaming")
 
         logger.info(f"Transformación completada. Filas restantes: {df.shape[0]}")
         return df
@@ -104,65 +148,150 @@ def transform_taxi_data(df: pl.DataFrame) -> pl.DataFrame:
         logger.error(f"Error en la transformación de datos: {str(e)}")
         raise
 
-def validate_taxi_data(df: pl.DataFrame) -> List[Dict[str, Any]]:
-    """Valida los datos usando el modelo Pydantic"""
-    logger.info("Iniciando validación de datos con Pydantic")
-    valid_records = []
+def validate_taxi_data(df: pl.DataFrame, method: str = "vectorized",
+                       run_id: Optional[str] = None, workers: Optional[int] = None) -> pl.DataFrame:
+    """
+    Valida los datos con las reglas del modelo Pydantic TaxiTrip y devuelve los registros
+    válidos con las columnas y tipos del modelo.
+
+    Con method="vectorized" las reglas se evalúan como expresiones Polars sobre columnas
+    completas (mismo resultado que Pydantic); con method="pydantic" se crea un modelo por fila.
+    Con method="sharded" la validación Pydantic se reparte por rangos de filas entre
+    workers procesos (VALIDATION_WORKERS por defecto) y los resultados se unen en el orden
+    original. Los registros rechazados de cada chunk se escriben en la cuarentena de la
+    ejecución run_id (ver etl_example.quarantine).
+    """
+    if method not in ("vectorized", "pydantic", "sharded"):
+        raise ValueError(f"Método de validación no soportado: {method}")
+
+    run_id = run_id or new_run_id()
+    workers = workers or VALIDATION_WORKERS
+    # En modo sharded cada chunk es un shard: al menos uno por worker aunque df sea pequeño
+    chunk_size = max(1, min(BATCH_SIZE, -(-df.height // workers))) if method == "sharded" else BATCH_SIZE
+    logger.info(f"Iniciando validación de datos ({method})")
+    valid_frames = []
+    reason_counts: Dict[str, int] = {}
     error_count = 0
 
-    chunk_size = BATCH_SIZE
-    total_rows = df.height
-
     try:
-        for start in range(0, total_rows, chunk_size):
-            chunk = df.slice(start, chunk_size)
-            records = chunk.to_dicts()
-
-            for i, record in enumerate(records, start=start):
-                try:
-                    validated_record = TaxiTrip(**record)
-                    valid_records.append(validated_record.dict())
-                except Exception as e:
-                    error_count += 1
-                    if error_count <= 10:  # Limitar el número de errores registrados
-                        logger.warning(f"Error de validación en el registro {i}: {str(e)}")
-
-        logger.info(f"Validación completada. Registros válidos: {len(valid_records)}, Errores: {error_count}")
-        return valid_records
+        chunks = (
+            df.slice(start, chunk_size).with_row_index(SOURCE_ROW_COLUMN, offset=start)
+            for start in range(0, df.height, chunk_size)
+        )
+        # spawn: Polars no es seguro tras un fork (igual que ExecutorPools en utils.etl_dag)
+        pool_context = (ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                        if method == "sharded" else nullcontext())
+        with pool_context as pool:
+            if method == "sharded":
+                # Los chunks se crean a medida que hay un worker libre para ellos
+                results = map_frames_in_process(pool, validate_records, chunks)
+            else:
+                results = (validate_records(chunk) if method == "pydantic" else validate_frame(chunk)
+                           for chunk in chunks)
+
+            for chunk_number, (valid, rejected) in enumerate(results):
+                valid_frames.append(valid)
+                error_count += write_quarantine(rejected, run_id, chunk_number)
+                if rejected.height:
+                    for reason in rejected[REASONS_COLUMN].explode():
+                        reason_counts[reason] = reason_counts.get(reason, 0) + 1
+
+        for reason, count in sorted(reason_counts.items(), key=lambda item: -item[1])[:10]:
+            logger.warning(f"Rechazos por {reason}: {count}")
+        if error_count:
+            logger.warning(f"{error_count} registros rechazados guardados en cuarentena (run_id={run_id})")
+
+        valid = pl.concat(valid_frames) if valid_frames else pl.DataFrame(schema=model_schema(df))
+        logger.info(f"Validación completada. Registros válidos: {valid.height}, Errores: {error_count}")
+        return valid
 
     except Exception as e:
         logger.error(f"Error en la validación de datos: {str(e)}")
         raise
 
-def load_taxi_data(validated_data: List[Dict[str, Any]]) -> None:
-    """Carga los datos validados en la base de datos"""
-    logger.info("Iniciando carga de datos en la base de datos")
+def load_taxi_data(validated_data: Union[pl.DataFrame, List[Dict[str, Any]]], method: str = "upsert") -> int:
+    """
+    Carga los datos validados en la base de datos y devuelve el número de viajes insertados.
+
+    Cada viaje se guarda con el hash de su clave natural (with_row_hash), único en la tabla.
+    Con method="upsert" cada lote es un único INSERT ... ON CONFLICT DO NOTHING ejecutado
+    con executemany del driver: los viajes ya cargados se omiten, así que repetir una carga
+    o solapar rellenos no duplica nada. method="bulk" es el mismo INSERT sin ignorar
+    conflictos (un viaje repetido es un error) y method="orm" usa la sesión y TaxiTripRecord.
+    """
+    if method not in ("upsert", "bulk", "orm"):
+        raise ValueError(f"Método de carga no soportado: {method}")
+
+    logger.info(f"Iniciando carga de datos en la base de datos ({method})")
 
     try:
-        # Inicializar la base de datos
-        init_db()
+        # Inicializar la base de datos (el engine y su pool se reutilizan entre ejecuciones)
+        engine = init_db()
 
-        # Obtener una sesión
-        session = get_session()
+        if not isinstance(validated_data, pl.DataFrame):
+            validated_data = pl.from_dicts(validated_data, infer_schema_length=None)
+        validated_data = with_row_hash(validated_data)
 
         # Procesar en lotes para evitar problemas de memoria
         total_records = len(validated_data)
-        batch_size = min(BATCH_SIZE, total_records)
-
-        for i in range(0, total_records, batch_size):
-            batch = validated_data[i:i+batch_size]
-
-            # Crear registros en la base de datos
-            _load_batch(session, batch)
-
-            logger.info(f"Lote procesado: {i+1} a {min(i+batch_size, total_records)} de {total_records}")
-
-        logger.info("Carga de datos completada exitosamente")
+        batch_size = max(1, min(BATCH_SIZE, total_records))
+        inserted = 0
+
+        # Durante la carga SQLite usa el perfil de escritura rápida (cada lote es una sola
+        # transacción) y al terminar se restaura el durable. Si la carga es grande respecto
+        # a la tabla, los índices secundarios se reconstruyen una vez al final en lugar de
+        # actualizarse fila a fila. La sesión ORM se cierra al terminar, también si falla un lote
+        with sqlite_load_profile(), deferred_indexes(expected_rows=total_records), \
+                (session_scope() if method == "orm" else nullcontext()) as session:
+            for i in range(0, total_records, batch_size):
+                batch = validated_data[i:i+batch_size]
+
+                # Crear registros en la base de datos
+                if session is not None:
+                    _load_batch(session, batch.to_dicts())
+                    inserted += batch.height
+                else:
+                    with engine.begin() as connection:
+                        inserted += _load_batch_bulk(connection, batch, upsert=(method == "upsert"))
+
+                logger.info(f"Lote procesado: {i+1} a {min(i+batch_size, total_records)} de {total_records}")
+
+        logger.info(f"Carga de datos completada exitosamente. Insertados: {inserted}, "
+                    f"ya existentes: {total_records - inserted}")
+        return inserted
 
     except Exception as e:
         logger.error(f"Error en la carga de datos: {str(e)}")
         raise
 
+def _load_batch_bulk(connection: Connection, batch: pl.DataFrame, upsert: bool = False) -> int:
+    """
+    Carga un lote con un INSERT y executemany del driver, en la transacción de connection.
+    Con upsert=True se omiten los viajes cuyo row_hash ya existe. Devuelve las filas insertadas.
+    El atajo sin conversores de SQLAlchemy es solo para SQLite; en otras bases de datos el
+    executemany pasa por connection.execute.
+    """
+    # Asegurar que las ubicaciones existan
+    location_ids = pl.concat([batch["pickup_location_id"], batch["dropoff_location_id"]]).unique().to_list()
+    ensure_locations(connection, location_ids)
+
+    table = TaxiTripRecord.__table__
+    statement = insert_ignoring_conflicts(table, connection.dialect.name) if upsert else insert(table)
+    if connection.dialect.name != "sqlite":
+        # positiontup y el formato de las fechas solo valen para el paramstyle qmark de SQLite
+        return connection.execute(statement, batch.to_dicts()).rowcount
+
+    # El INSERT de Core se compila una vez para las columnas del lote y las filas se pasan
+    # como tuplas al executemany del driver, sin los conversores de tipo de SQLAlchemy:
+    # las fechas se formatean en Polars igual que las guarda el tipo DateTime en SQLite
+    statement = statement.compile(dialect=connection.dialect, column_keys=batch.columns)
+    rows = (
+        batch.select(statement.positiontup)
+        .with_columns(pl.col(pl.Datetime).dt.strftime(SQLITE_DATETIME_FORMAT))
+        .rows()
+    )
+    return connection.exec_driver_sql(statement.string, rows).rowcount
+
 def _load_batch(session: Session, batch: List[Dict[str, Any]]) -> None:
     """Carga un lote de registros en la base de datos"""
     try:
@@ -172,23 +301,8 @@ def _load_batch(session: Session, batch: List[Dict[str, Any]]) -> None:
             location_ids.add(record['pickup_location_id'])
             location_ids.add(record['dropoff_location_id'])
 
-        # Verificar qué ubicaciones ya existen en la base de datos
-        existing_locations = {loc.location_id for loc in session.query(TaxiLocation.location_id).filter(TaxiLocation.location_id.in_(location_ids)).all()}
-
-        # Crear las ubicaciones que no existen
-        for location_id in location_ids:
-            if location_id not in existing_locations:
-                # Crear una ubicación temporal
-                location = TaxiLocation(
-                    location_id=location_id,
-                    borough="Unknown",
-                    zone=f"Zone {location_id}",
-                    service_zone="Unknown"
-                )
-                session.add(location)
-
-        # Guardar las ubicaciones
-        session.commit()
+        # Crear las que no existen en la misma transacción que los viajes
+        ensure_locations(session.connection(), location_ids)
 
         # Crear los registros de viajes
         for record in batch:
@@ -209,7 +323,8 @@ def _load_batch(session: Session, batch: List[Dict[str, Any]]) -> None:
                 total_amount=record['total_amount'],
                 congestion_surcharge=record['congestion_surcharge'],
                 airport_fee=record['airport_fee'],
-                payment_type=record['payment_type']
+                payment_type=record['payment_type'],
+                row_hash=record.get('row_hash')
             )
             session.add(trip)
 
@@ -221,33 +336,194 @@ def _load_batch(session: Session, batch: List[Dict[str, Any]]) -> None:
         logger.error(f"Error al cargar lote en la base de datos: {str(e)}")
         raise
 
+# Modo streaming: extracción, transformación, validación y carga por chunks, cada etapa
+# en su propio hilo y unidas por colas acotadas, de modo que la carga del chunk N se
+# solapa con la validación del N+1 y en memoria solo hay unos pocos chunks
+_END_OF_STREAM = object()
+
+class _PipelineStopped(Exception):
+    pass
+
+def _put(queue: Queue, item: Any, stop: threading.Event) -> None:
+    while True:
+        if stop.is_set():
+            raise _PipelineStopped()
+        try:
+            queue.put(item, timeout=0.1)
+            return
+        except Full:
+            continue
+
+def _drain(queue: Queue, stop: threading.Event) -> Iterator[Any]:
+    while True:
+        if stop.is_set():
+            raise _PipelineStopped()
+        try:
+            item = queue.get(timeout=0.1)
+        except Empty:
+            continue
+        if item is _END_OF_STREAM:
+            return
+        yield item
+
+def _run_stage(name: str, func: Callable, inbox: Optional[Queue], outbox: Optional[Queue],
+               stop: threading.Event, errors: List[Exception]) -> None:
+    """Cuerpo del hilo de una etapa: sin inbox, func genera los chunks; si no, se aplica a cada uno"""
+    try:
+        items = func() if inbox is None else (func(item) for item in _drain(inbox, stop))
+        for item in items:
+            if outbox is not None:
+                _put(outbox, item, stop)
+        if outbox is not None:
+            _put(outbox, _END_OF_STREAM, stop)
+    except _PipelineStopped:
+        pass
+    except Exception as e:
+        logger.error(f"Error en la etapa '{name}' del modo streaming: {str(e)}")
+        errors.append(e)
+        stop.set()
+
+def _parquet_files(file_path: str) -> List[Path]:
+    path = Path(file_path)
+    return sorted(path.rglob("*.parquet")) if path.is_dir() else [path]
+
+def _read_chunks(file_path: str, max_chunk_rows: int) -> Iterator[pl.DataFrame]:
+    """Chunks del parquet (o de un directorio de parquets) por row groups, con las columnas del modelo"""
+    for file in _parquet_files(file_path):
+        # ParquetFile lee cada row group por separado; pyarrow.dataset retiene memoria
+        # proporcional al archivo aunque se desactive la lectura anticipada
+        parquet_file = pyarrow.parquet.ParquetFile(file)
+        columns = [col for col in parquet_file.schema_arrow.names if COLUMN_MAPPING.get(col, col) in TaxiTrip.model_fields]
+        for i in range(parquet_file.num_row_groups):
+            if parquet_file.metadata.row_group(i).num_rows <= max_chunk_rows:
+                tables = [parquet_file.read_row_group(i, columns=columns)]
+            else:
+                tables = parquet_file.iter_batches(batch_size=max_chunk_rows, row_groups=[i], columns=columns)
+            for table in tables:
+                yield _model_columns(pl.from_arrow(table).lazy()).collect()
+
+def run_streaming_etl(file_path: str = str(TAXI_DATA_FILE_SMALL), run_id: Optional[str] = None,
+                      queue_size: int = STREAM_QUEUE_SIZE,
+                      max_chunk_rows: int = STREAM_MAX_CHUNK_ROWS) -> Dict[str, Any]:
+    """
+    Ejecuta el ETL completo por chunks con las cuatro etapas en paralelo.
+
+    Los rechazados de cada chunk van a la cuarentena de run_id y los válidos se cargan
+    con la carga masiva idempotente (upsert). Devuelve las estadísticas de la ejecución.
+    """
+    run_id = run_id or new_run_id()
+    logger.info(f"Iniciando ETL en modo streaming del archivo: {file_path} (run_id={run_id})")
+    start_time = time.time()
+    stats = {"run_id": run_id, "chunks": 0, "rows_read": 0, "rows_valid": 0, "rows_rejected": 0,
+             "rows_inserted": 0, "first_load_seconds": None}
+    engine = init_db()
+    validated_rows = 0
+
+    def extract() -> Iterator[pl.DataFrame]:
+        for chunk in _read_chunks(file_path, max_chunk_rows):
+            stats["rows_read"] += chunk.height
+            yield chunk
+
+    def transform(chunk: pl.DataFrame) -> pl.DataFrame:
+        return _transform_plan(chunk.lazy()).collect()
+
+    def validate(chunk: pl.DataFrame) -> pl.DataFrame:
+        nonlocal validated_rows
+        valid, rejected = validate_frame(chunk.with_row_index(SOURCE_ROW_COLUMN, offset=validated_rows))
+        stats["rows_rejected"] += write_quarantine(rejected, run_id, stats["chunks"])
+        validated_rows += chunk.height
+        stats["chunks"] += 1
+        return valid
+
+    def load(valid: pl.DataFrame) -> None:
+        if valid.height:
+            with engine.begin() as connection:
+                stats["rows_inserted"] += _load_batch_bulk(connection, with_row_hash(valid), upsert=True)
+        if stats["first_load_seconds"] is None:
+            stats["first_load_seconds"] = time.time() - start_time
+        stats["rows_valid"] += valid.height
+        logger.info(f"Chunk cargado: {valid.height} filas (total {stats['rows_valid']})")
+
+    stages = [("extract", extract), ("transform", transform), ("validate", validate), ("load", load)]
+    queues = [Queue(maxsize=queue_size) for _ in stages[:-1]]
+    stop = threading.Event()
+    errors: List[Exception] = []
+    threads = [
+        threading.Thread(
+            target=_run_stage, name=f"etl-{name}", daemon=True,
+            args=(name, func, queues[i - 1] if i > 0 else None, queues[i] if i < len(queues) else None, stop, errors),
+        )
+        for i, (name, func) in enumerate(stages)
+    ]
+
+    # Las filas del origen (de los metadatos del parquet) deciden si se difieren los índices
+    expected_rows = sum(pyarrow.parquet.ParquetFile(file).metadata.num_rows for file in _parquet_files(file_path))
+    with sqlite_load_profile(), deferred_indexes(expected_rows=expected_rows):
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            # Si el hilo principal se interrumpe, las etapas también se detienen
+            stop.set()
+
+    if errors:
+        raise errors[0]
+
+    stats["seconds"] = time.time() - start_time
+    logger.info(f"ETL en modo streaming completado en {stats['seconds']:.2f} segundos. "
+                f"Chunks: {stats['chunks']}, válidos: {stats['rows_valid']} (insertados: {stats['rows_inserted']}), "
+                f"rechazados: {stats['rows_rejected']}, "
+                f"primera carga a los {stats['first_load_seconds'] or 0:.2f} segundos")
+    return stats
+
 # Definir las tareas del DAG
-extract_task = taxi_dag.task("extract_data", extract_taxi_data)
-transform_task = taxi_dag.task("transform_data", transform_taxi_data)
-validate_task = taxi_dag.task("validate_data", validate_taxi_data)
-load_task = taxi_dag.task("load_data", load_taxi_data)
+# (inputs indica qué parámetro recibe el resultado de cada tarea upstream).
+# La extracción devuelve un plan perezoso que se ejecuta en la transformación, que se
+# cachea: la huella del plan incluye el estado del archivo de origen, así que una
+# reejecución con el mismo archivo no lo vuelve a leer. La clave incluye también el
+# código de _transform_plan (cache_sources): cambiar un filtro invalida la caché. La validación y la carga no se
+# cachean porque escriben la cuarentena y la base de datos. La validación vectorizada se
+# ejecuta en el pool de hilos de Polars, sin proceso aparte.
+task_cache = TaskCache(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES)
+
+extract_task = taxi_dag.task("extract_data", extract_taxi_data, lazy=True)
+transform_task = taxi_dag.task("transform_data", transform_taxi_data, options=TaskOptions(
+    inputs={"df": "extract_data"}, cache=task_cache, cache_sources=(_transform_plan,)))
+validate_task = taxi_dag.task("validate_data", validate_taxi_data,
+                              options=TaskOptions(inputs={"df": "transform_data"}))
+load_task = taxi_dag.task("load_data", load_taxi_data, options=TaskOptions(inputs={"validated_data": "validate_data"}))
 
 # Configurar las dependencias
 extract_task.set_downstream(transform_task)
 transform_task.set_downstream(validate_task)
 validate_task.set_downstream(load_task)
 
+def _export_report(report: RunReport) -> None:
+    """Guarda las métricas de la ejecución en JSON y como Chrome trace"""
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    name = report.run_id or time.strftime("%Y%m%d_%H%M%S")
+    report.to_json(REPORT_DIR / f"{name}.json")
+    report.to_chrome_trace(REPORT_DIR / f"{name}.trace.json")
+    logger.info(f"Informe de métricas guardado en {REPORT_DIR}")
+
 # Versión síncrona del flujo ETL
-def nyc_taxi_etl_flow():
-    """Ejecuta el flujo ETL para taxis de Nueva York de forma secuencial"""
+def nyc_taxi_etl_flow(streaming: bool = False):
+    """
+    Ejecuta el flujo ETL para taxis de Nueva York de forma secuencial, o por chunks en
+    paralelo con streaming=True (memoria constante sea cual sea el tamaño del archivo)
+    """
     logger.info("Iniciando flujo ETL para datos de taxis de Nueva York")
 
-    # Extraer datos
-    raw_data = extract_taxi_data()
-
-    # Transformar datos
-    transformed_data = transform_taxi_data(raw_data)
-
-    # Validar datos
-    validated_data = validate_taxi_data(transformed_data)
+    if streaming:
+        run_streaming_etl()
+        logger.info("Flujo ETL completado exitosamente")
+        return
 
-    # Cargar datos
-    load_taxi_data(validated_data)
+    # El DAG pasa el resultado de cada etapa a la siguiente
+    results = taxi_dag.run_sync()
+    _export_report(results.report)
 
     logger.info("Flujo ETL completado exitosamente")
 
@@ -258,8 +534,22 @@ async def run_taxi_etl_dag():
 
     try:
         results = await taxi_dag.run()
+        _export_report(results.report)
         logger.info("DAG de ETL completado exitosamente")
         return results
     except Exception as e:
         logger.error(f"Error al ejecutar el DAG de ETL: {str(e)}")
         raise
+
+async def resume_taxi_etl_dag(run_id: str):
+    """Reanuda una ejecución fallida del DAG repitiendo solo las tareas pendientes"""
+    logger.info(f"Reanudando DAG de ETL para taxis de Nueva York (run_id={run_id})")
+
+    try:
+        results = await taxi_dag.resume(run_id)
+        _export_report(results.report)
+        logger.info("DAG de ETL completado exitosamente")
+        return results
+    except Exception as e:
+        logger.error(f"Error al reanudar el DAG de ETL: {str(e)}")
+        raise
@@ -0,0 +1,56 @@
+"""
+Cuarentena de registros rechazados en la validación
+"""
+import os
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
+
+import polars as pl
+
+from etl_example.etl_config import QUARANTINE_DIR
+from etl_example.validation import REASONS_COLUMN
+
+# Motivo principal (el primero que falla) por el que se particiona el dataset
+REASON_PARTITION = "reason"
+
+
+def write_quarantine(rejected: pl.DataFrame, run_id: str, chunk: int,
+                     quarantine_dir: Path = QUARANTINE_DIR) -> int:
+    """
+    Escribe de una vez las filas rechazadas de un chunk en el dataset de cuarentena.
+
+    El dataset es Hive (run_id=.../reason=.../part-<chunk>.parquet), legible con
+    pl.scan_parquet(quarantine_dir, hive_partitioning=True). Cada fila conserva sus
+    valores originales y todos sus códigos de rechazo en REASONS_COLUMN.
+    """
+    if rejected.height == 0:
+        return 0
+
+    primary = rejected.with_columns(pl.col(REASONS_COLUMN).list.first().alias(REASON_PARTITION))
+    for (reason,), group in primary.partition_by(REASON_PARTITION, as_dict=True).items():
+        # Los códigos llevan ":" (no válido en rutas de Windows): se codifican como en Hive
+        part_dir = Path(quarantine_dir) / f"run_id={run_id}" / f"{REASON_PARTITION}={quote(reason, safe='')}"
+        part_dir.mkdir(parents=True, exist_ok=True)
+        part_file = part_dir / f"part-{chunk:05d}.parquet"
+        tmp_file = part_dir / f".{part_file.name}.tmp"
+        group.drop(REASON_PARTITION).write_parquet(tmp_file)
+        os.replace(tmp_file, part_file)
+    return rejected.height
+
+
+def read_quarantine(run_id: Optional[str] = None, quarantine_dir: Path = QUARANTINE_DIR) -> pl.LazyFrame:
+    """Registros en cuarentena (de una ejecución o de todas) para auditarlos o reprocesarlos"""
+    root = Path(quarantine_dir)
+    run_ids = [run_id] if run_id else sorted(p.name.split("=", 1)[1] for p in root.glob("run_id=*"))
+    if not run_ids or not (root / f"run_id={run_ids[0]}").exists():
+        raise FileNotFoundError(f"No hay registros en cuarentena en {root}" + (f" para {run_id}" if run_id else ""))
+
+    # Los tipos de origen pueden cambiar entre ejecuciones: cada una se lee por separado
+    scans = [
+        pl.scan_parquet(root / f"run_id={run}", hive_partitioning=True,
+                        hive_schema={REASON_PARTITION: pl.String})
+        .with_columns(pl.lit(run).alias("run_id"))
+        for run in run_ids
+    ]
+    return pl.concat(scans, how="diagonal_relaxed")
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from utils import DAG, TaskOptions
+
+
+def _noop():
+    return None
+
+
+@pytest.fixture
+def cadena():
+    """Fixture que crea un DAG a -> b -> c."""
+    dag = DAG("test_dag")
+    a, b, c = (dag.task(name, _noop) for name in "abc")
+    a.set_downstream(b)
+    b.set_downstream(c)
+    return dag
+
+
+@pytest.mark.parametrize("upstream, downstream", [("b", "a"), ("c", "a"), ("c", "b"), ("a", "a")])
+def test_ciclo_detectado_al_anadir_la_arista(cadena, upstream, downstream):
+    """Una arista que cierra un ciclo falla en set_downstream, no al ejecutar."""
+    with pytest.raises(ValueError, match="Ciclo detectado"):
+        cadena.tasks[upstream].set_downstream(cadena.tasks[downstream])
+    assert cadena.tasks[downstream] not in cadena.tasks[upstream].downstream_tasks
+
+
+def test_arista_sin_ciclo_permitida(cadena):
+    """Un atajo hacia delante no es un ciclo."""
+    cadena.tasks["c"].set_upstream(cadena.tasks["a"])
+    assert [task.name for task in cadena.get_execution_order()] == ["a", "b", "c"]
+
+
+def test_espera_en_el_semaforo_cuenta_como_cola():
+    """Con max_concurrency=1, la tercera tarea espera a las dos anteriores y lo reporta."""
+    dag = DAG("test_cola")
+    for name in ("t1", "t2", "t3"):
+        dag.task(name, time.sleep, 0.3)
+    report = dag.run_sync(mode="parallel", max_concurrency=1).report
+
+    waits = sorted(metrics.queue_wait_seconds for metrics in report.tasks)
+    assert waits[0] < 0.1
+    assert waits[2] >= 0.55, f"La última tarea debería esperar ~0.6 s, esperó {waits[2]:.2f} s"
+
+
+def _echo(value, timeout=None, retry=None, cache=None):
+    return value, timeout, retry, cache
+
+
+def test_kwargs_con_nombre_de_opcion_llegan_a_la_funcion():
+    """timeout, retry o cache como kwargs son argumentos de la función, no opciones de la tarea."""
+    dag = DAG("test_kwargs")
+    task = dag.task("echo", _echo, 1, timeout=10, retry=2, cache="x")
+    assert task.timeout is None and task.retry is None and task.cache is None
+    assert dag.run_sync()["echo"] == (1, 10, 2, "x")
+
+
+def test_opciones_de_la_tarea():
+    """Las opciones de la tarea van en TaskOptions."""
+    dag = DAG("test_opciones")
+    dag.task("lenta", time.sleep, 1, options=TaskOptions(timeout=0.1))
+    with pytest.raises(TimeoutError):
+        dag.run_sync()
+
+
+def test_executor_no_soportado():
+    """TaskOptions valida el executor al crearse."""
+    with pytest.raises(ValueError, match="Executor no soportado"):
+        TaskOptions(executor="gpu")
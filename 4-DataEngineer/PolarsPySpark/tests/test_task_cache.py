@@ -0,0 +1,67 @@
+import importlib.util
+
+import pytest
+
+from utils import DAG, TaskCache, TaskOptions
+
+HELPERS = '''
+def helper(x):
+    return x + {increment}
+
+
+def task(x):
+    return helper(x)
+'''
+
+
+def _load_module(path, name):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def helpers(tmp_path):
+    """Fixture que escribe un módulo con una tarea y el helper que usa, y permite editar el helper."""
+    path = tmp_path / "cache_helpers.py"
+
+    def write(increment):
+        path.write_text(HELPERS.format(increment=increment), encoding="utf-8")
+        return _load_module(path, f"cache_helpers_{increment}")
+
+    return write
+
+
+def _run(module, cache, cache_sources=()):
+    dag = DAG("test_cache")
+    dag.task("task", module.task, 1, options=TaskOptions(cache=cache, cache_sources=tuple(cache_sources)))
+    result = dag.run_sync()
+    return result["task"], result.report.tasks[0].cached
+
+
+def test_misma_fuente_recupera_de_cache(helpers, tmp_path):
+    """Sin cambios en el código, la segunda ejecución sale de la caché."""
+    cache = TaskCache(cache_dir=tmp_path / "cache")
+    module = helpers(1)
+    assert _run(module, cache, cache_sources=[module.helper]) == (2, False)
+    assert _run(module, cache, cache_sources=[module.helper]) == (2, True)
+
+
+def test_editar_helper_invalida_la_cache(helpers, tmp_path):
+    """Cambiar un helper declarado en cache_sources no devuelve el resultado anterior."""
+    cache = TaskCache(cache_dir=tmp_path / "cache")
+    module = helpers(1)
+    assert _run(module, cache, cache_sources=[module.helper]) == (2, False)
+
+    module = helpers(10)
+    assert _run(module, cache, cache_sources=[module.helper]) == (11, False), "El helper editado debe provocar un fallo de caché"
+
+
+def test_version_invalida_la_cache(helpers, tmp_path):
+    """Una cadena de versión en cache_sources forma parte de la clave."""
+    cache = TaskCache(cache_dir=tmp_path / "cache")
+    module = helpers(1)
+    assert _run(module, cache, cache_sources=["v1"]) == (2, False)
+    assert _run(module, cache, cache_sources=["v1"]) == (2, True)
+    assert _run(module, cache, cache_sources=["v2"]) == (2, False)
@@ -0,0 +1,112 @@
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+from etl_example.validation import REASONS_COLUMN, validate_frame, validate_records
+
+N_FILAS = 2000
+
+# Valores inválidos (o límite) que se inyectan en el corpus: nulos, NaN/inf, ids
+# fraccionarios, importes negativos y fechas invertidas
+CASOS = [
+    ("vendor_id", None), ("vendor_id", 1.5), ("vendor_id", math.nan), ("vendor_id", math.inf),
+    ("pickup_location_id", None), ("payment_type", None),
+    ("trip_distance", -1.0), ("trip_distance", math.nan), ("trip_distance", None), ("trip_distance", -math.inf),
+    ("passenger_count", -1.0), ("passenger_count", 10.0), ("passenger_count", math.nan),
+    ("passenger_count", None), ("passenger_count", 9.0), ("passenger_count", 0.0),
+    ("fare_amount", -0.01), ("fare_amount", None), ("fare_amount", math.nan),
+    ("total_amount", -5.0), ("total_amount", math.inf),
+    ("pickup_datetime", None), ("pickup_datetime", datetime(2030, 1, 1)),
+    ("dropoff_datetime", None), ("dropoff_datetime", datetime(2020, 1, 1)),
+]
+
+ESQUEMA = {
+    "vendor_id": pl.Float64,
+    "pickup_datetime": pl.Datetime("us"),
+    "dropoff_datetime": pl.Datetime("us"),
+    "pickup_location_id": pl.Int64,
+    "dropoff_location_id": pl.Int64,
+    "passenger_count": pl.Float64,
+    "trip_distance": pl.Float64,
+    "fare_amount": pl.Float64,
+    "extra": pl.Float64,
+    "mta_tax": pl.Float64,
+    "tip_amount": pl.Float64,
+    "tolls_amount": pl.Float64,
+    "improvement_surcharge": pl.Float64,
+    "total_amount": pl.Float64,
+    "congestion_surcharge": pl.Float64,
+    "airport_fee": pl.Float64,
+    "payment_type": pl.Int64,
+}
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    """Corpus determinista de viajes con uno o dos valores inválidos en ~40% de las filas."""
+    rng = np.random.default_rng(16)
+    inicio = datetime(2024, 1, 1)
+    filas = []
+    for i in range(N_FILAS):
+        pickup = inicio + timedelta(seconds=int(rng.integers(0, 30 * 24 * 3600)))
+        fila = {
+            "vendor_id": float(1 + i % 2),
+            "pickup_datetime": pickup,
+            "dropoff_datetime": pickup + timedelta(seconds=int(rng.integers(60, 3600))),
+            "pickup_location_id": int(rng.integers(1, 266)),
+            "dropoff_location_id": int(rng.integers(1, 266)),
+            "passenger_count": float(rng.integers(1, 5)),
+            "trip_distance": float(rng.uniform(0, 20)),
+            "fare_amount": float(rng.uniform(3, 80)),
+            "extra": 1.0,
+            "mta_tax": 0.5,
+            "tip_amount": float(rng.uniform(0, 10)),
+            "tolls_amount": 0.0,
+            "improvement_surcharge": 1.0,
+            "total_amount": float(rng.uniform(5, 100)),
+            "congestion_surcharge": 2.5 if i % 3 else None,
+            "airport_fee": None,
+            "payment_type": int(rng.integers(1, 5)),
+        }
+        for _ in range(int(rng.random() < 0.4) + int(rng.random() < 0.1)):
+            columna, valor = CASOS[int(rng.integers(len(CASOS)))]
+            fila[columna] = valor
+        filas.append(fila)
+    return pl.DataFrame(filas, schema=ESQUEMA, orient="row").with_row_index("source_row")
+
+
+@pytest.fixture(scope="module")
+def resultados(corpus):
+    """Resultados (válidos, rechazados) de la validación vectorizada y de la de Pydantic."""
+    return validate_frame(corpus), validate_records(corpus)
+
+
+def test_validos_identicos(resultados):
+    """Los registros válidos coinciden en filas, valores y tipos con los de Pydantic."""
+    (validos, _), (validos_pydantic, _) = resultados
+    assert validos.schema == validos_pydantic.schema
+    assert validos.equals(validos_pydantic)
+
+
+def test_rechazados_identicos(resultados):
+    """Se rechazan las mismas filas y con los mismos códigos, en el mismo orden."""
+    (_, rechazados), (_, rechazados_pydantic) = resultados
+    assert rechazados["source_row"].to_list() == rechazados_pydantic["source_row"].to_list()
+    assert rechazados.equals(rechazados_pydantic)
+
+
+def test_corpus_cubre_los_casos(resultados):
+    """El corpus ejercita nulos, NaN/inf, ids fraccionarios, importes negativos y fechas invertidas."""
+    (_, rechazados), _ = resultados
+    codigos = set(rechazados[REASONS_COLUMN].explode().to_list())
+    assert {
+        "vendor_id:null", "vendor_id:int_from_float", "vendor_id:finite_number",
+        "trip_distance:trip_distance_must_be_positive", "trip_distance:null",
+        "passenger_count:passenger_count_must_be_valid",
+        "fare_amount:amount_must_be_valid", "total_amount:amount_must_be_valid",
+        "pickup_datetime:null", "dropoff_datetime:dropoff_after_pickup",
+        "payment_type:null", "pickup_location_id:null",
+    } <= codigos
@@ -1,2 +1,6 @@
 from .unificador import ParquetMerger
-from .etl_dag import DAG, run_script
+from .etl_dag import DAG, TaskOptions, run_script
+from .task_cache import TaskCache
+from .task_metrics import RunReport, RunResult
+from .script_pool import ScriptPool
+from .retry import RetryPolicy
@@ -0,0 +1,93 @@
+# bench_dag.py
+"""
+Benchmark del orden topológico de DAG.get_execution_order.
+
+Construye DAGs por particiones (extract_i -> transform_i -> merge) y cadenas profundas
+conectadas de la última tarea a la primera, de hasta 10k tareas, y compara el algoritmo
+de Kahn actual con el recorrido por pasadas anterior. La construcción se mide aparte:
+incluye la detección de ciclos de cada arista y debe crecer linealmente con el DAG.
+
+Uso: python -m utils.bench_dag
+"""
+import logging
+import time
+from typing import List
+
+from .etl_dag import DAG, Task
+
+
+def _noop():
+    return None
+
+
+def build_partitioned_dag(n_tasks: int) -> DAG:
+    dag = DAG(f"bench_{n_tasks}")
+    partitions = max(1, (n_tasks - 1) // 2)
+    merge = dag.task("merge", _noop)
+    for i in range(partitions):
+        extract = dag.task(f"extract_{i}", _noop)
+        transform = dag.task(f"transform_{i}", _noop)
+        extract.set_downstream(transform)
+        transform.set_downstream(merge)
+    return dag
+
+
+def build_reverse_chain_dag(n_tasks: int) -> DAG:
+    """Cadena task_0 -> ... -> task_n-1 cuyas aristas se añaden desde el final"""
+    dag = DAG(f"chain_{n_tasks}")
+    tasks = [dag.task(f"task_{i}", _noop) for i in range(n_tasks)]
+    for i in reversed(range(n_tasks - 1)):
+        tasks[i].set_downstream(tasks[i + 1])
+    return dag
+
+
+def legacy_execution_order(dag: DAG) -> List[Task]:
+    """Algoritmo anterior: repasa todas las tareas pendientes en cada pasada"""
+    remaining_tasks = list(dag.tasks.values())
+    execution_order = []
+    while remaining_tasks:
+        ready_tasks = [
+            task for task in remaining_tasks
+            if all(dep in execution_order for dep in task.upstream_tasks)
+        ]
+        if not ready_tasks:
+            raise ValueError("Ciclo detectado en el DAG")
+        execution_order.extend(ready_tasks)
+        for task in ready_tasks:
+            remaining_tasks.remove(task)
+    return execution_order
+
+
+def _measure(builder, n: int, legacy_limit: int) -> None:
+    start = time.perf_counter()
+    dag = builder(n)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    order = dag.get_execution_order()
+    kahn = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dag.get_execution_order()
+    cached = time.perf_counter() - start
+
+    legacy = "-"
+    if n <= legacy_limit:
+        start = time.perf_counter()
+        assert {t.name for t in legacy_execution_order(dag)} == {t.name for t in order}
+        legacy = f"{time.perf_counter() - start:.4f}"
+
+    print(f"{len(dag.tasks):>8} {build:>17.4f} {kahn:>10.4f} {cached:>13.6f} {legacy:>13}")
+
+
+def main(sizes=(100, 1_000, 5_000, 10_000), legacy_limit: int = 2_000):
+    logging.disable(logging.CRITICAL)
+    print(f"{'tareas':>8} {'construcción (s)':>17} {'kahn (s)':>10} {'cacheado (s)':>13} {'anterior (s)':>13}")
+    for shape, builder in (("particiones", build_partitioned_dag), ("cadena inversa", build_reverse_chain_dag)):
+        print(shape)
+        for n in sizes:
+            _measure(builder, n, legacy_limit)
+
+
+if __name__ == "__main__":
+    main()
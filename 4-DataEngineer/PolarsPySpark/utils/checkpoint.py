@@ -0,0 +1,105 @@
+# checkpoint.py
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+from uuid import uuid4
+
+from .task_cache import save_value, load_value
+
+SUCCESS = "success"
+FAILED = "failed"
+
+
+def new_run_id() -> str:
+    return f"{datetime.now():%Y%m%d_%H%M%S}_{uuid4().hex[:6]}"
+
+
+class RunCheckpoint:
+    """
+    Estado persistente de una ejecución de un DAG.
+
+    En <checkpoint_dir>/<run_id>/ se guarda state.json con el estado de cada tarea y
+    un fichero con la salida de cada tarea completada, para poder reanudar la
+    ejecución sin repetir lo que ya terminó. Las ejecuciones terminadas con éxito no
+    necesitan reanudarse: prune las elimina conservando las keep más recientes.
+    """
+
+    def __init__(self, checkpoint_dir: Path, run_id: str, dag_id: str):
+        self.run_id = run_id
+        self.dag_id = dag_id
+        self.run_dir = Path(checkpoint_dir) / run_id
+        self.state_file = self.run_dir / "state.json"
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self.status: Optional[str] = None
+
+        if self.state_file.exists():
+            state = json.loads(self.state_file.read_text(encoding="utf-8"))
+            if state["dag_id"] != dag_id:
+                raise ValueError(f"La ejecución '{run_id}' pertenece al DAG '{state['dag_id']}', no a '{dag_id}'")
+            self.tasks = state["tasks"]
+            self.status = state.get("status")
+
+    def _save_state(self) -> None:
+        tmp_file = self.state_file.with_name("state.json.tmp")
+        state = {"dag_id": self.dag_id, "status": self.status, "tasks": self.tasks}
+        tmp_file.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        os.replace(tmp_file, self.state_file)
+
+    def completed_tasks(self) -> Set[str]:
+        return {
+            name for name, info in self.tasks.items()
+            if info["status"] == SUCCESS and (self.run_dir / info["output"]).exists()
+        }
+
+    def save_output(self, task_name: str, result: Any) -> Path:
+        """Escribe la salida de una tarea; es la parte lenta y se puede hacer fuera del event loop"""
+        return save_value(self.run_dir / task_name, result)
+
+    def mark_success(self, task_name: str, output: Path, result_fingerprint: Optional[str]) -> None:
+        self.tasks[task_name] = {
+            "status": SUCCESS,
+            "output": output.name,
+            "fingerprint": result_fingerprint,
+            "finished_at": datetime.now().isoformat(),
+        }
+        self._save_state()
+
+    def mark_failed(self, task_name: str, error: Exception) -> None:
+        self.tasks[task_name] = {
+            "status": FAILED,
+            "error": f"{type(error).__name__}: {error}",
+            "finished_at": datetime.now().isoformat(),
+        }
+        self._save_state()
+
+    def load_output(self, task_name: str) -> Any:
+        return load_value(self.run_dir / self.tasks[task_name]["output"])
+
+    def fingerprint(self, task_name: str) -> Optional[str]:
+        return self.tasks[task_name].get("fingerprint")
+
+    def mark_run_success(self) -> None:
+        self.status = SUCCESS
+        self._save_state()
+
+    @staticmethod
+    def prune(checkpoint_dir: Path, dag_id: str, keep: int = 0) -> List[str]:
+        """Elimina las ejecuciones con éxito de dag_id salvo las keep más recientes; devuelve sus run_id"""
+        successful = []
+        for state_file in Path(checkpoint_dir).glob("*/state.json"):
+            try:
+                state = json.loads(state_file.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if state.get("dag_id") == dag_id and state.get("status") == SUCCESS:
+                successful.append((state_file.stat().st_mtime_ns, state_file.parent))
+
+        removed = []
+        for _, run_dir in sorted(successful, reverse=True)[keep:]:
+            shutil.rmtree(run_dir, ignore_errors=True)
+            removed.append(run_dir.name)
+        return removed
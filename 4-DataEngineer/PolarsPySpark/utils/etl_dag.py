@@ -1,132 +1,575 @@
 # etl_dag.py
 import asyncio
+import contextlib
+import inspect
 import logging
+import multiprocessing
 import time
 import os
-from typing import Dict, List, Callable, Any, Set, Union
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Callable, Any, Set, Tuple, Union, Optional
 import subprocess
 import sys
 
+from .task_cache import TaskCache, fingerprint, input_files
+from .checkpoint import RunCheckpoint, new_run_id
+from .shared_frames import call_in_process
+from .task_metrics import RunReport, RunResult, TaskMetrics, measured_call
+from .script_pool import ScriptPool, resolve_script_path, script_env
+from .retry import RetryPolicy
+
+EXECUTORS = ("inline", "thread", "process")
+_NO_LIMIT = contextlib.nullcontext()
+
+class ResultStore:
+    """
+    Almacén en memoria de los resultados de las tareas de un DAG.
+
+    Cada resultado se libera en cuanto termina su último consumidor (tarea downstream),
+    de modo que los DataFrames intermedios no se acumulan en cadenas largas.
+    """
+
+    def __init__(self, keep_results: bool = False):
+        self.keep_results = keep_results
+        self.results: Dict[str, Any] = {}
+        self.fingerprints: Dict[str, str] = {}
+        self._pending_consumers: Dict[str, int] = {}
+
+    def put(self, task: 'Task', result: Any, result_fingerprint: Optional[str] = None,
+            consumers: Optional[int] = None) -> None:
+        self.results[task.name] = result
+        if result_fingerprint is not None:
+            self.fingerprints[task.name] = result_fingerprint
+        self._pending_consumers[task.name] = len(task.downstream_tasks) if consumers is None else consumers
+
+    def get(self, name: str) -> Any:
+        return self.results[name]
+
+    def upstream_results(self, task: 'Task') -> Dict[str, Any]:
+        return {dep.name: self.results[dep.name] for dep in task.upstream_tasks}
+
+    def upstream_fingerprints(self, task: 'Task') -> Dict[str, str]:
+        """Huellas de los resultados upstream; solo se calculan si la tarea usa caché"""
+        if task.cache is None:
+            return {}
+        for dep in task.upstream_tasks:
+            if dep.name not in self.fingerprints:
+                self.fingerprints[dep.name] = fingerprint(self.results[dep.name],
+                                                          input_files(dep.func, dep.args, dep.kwargs))
+        return {dep.name: self.fingerprints[dep.name] for dep in task.upstream_tasks}
+
+    def release(self, task: 'Task') -> None:
+        """Marca la tarea como consumidora terminada de sus upstream_tasks"""
+        for dep in task.upstream_tasks:
+            self._pending_consumers[dep.name] -= 1
+            if self._pending_consumers[dep.name] == 0 and not self.keep_results:
+                del self.results[dep.name]
+                self.fingerprints.pop(dep.name, None)
+
+class ExecutorPools:
+    """Pools de hilos y procesos compartidos por las tareas de una ejecución, creados bajo demanda"""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._pools: Dict[str, Executor] = {}
+
+    def get(self, kind: str) -> Optional[Executor]:
+        if kind == "inline":
+            return None
+        if kind not in self._pools:
+            if kind == "process":
+                # "spawn" evita bloqueos al hacer fork de un proceso con los hilos de Polars ya activos
+                self._pools[kind] = ProcessPoolExecutor(max_workers=min(self.max_workers, os.cpu_count() or 1),
+                                                        mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._pools[kind] = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._pools[kind]
+
+    def shutdown(self, wait: bool = True) -> None:
+        for pool in self._pools.values():
+            pool.shutdown(wait=wait, cancel_futures=not wait)
+        self._pools.clear()
+
+    def __enter__(self) -> 'ExecutorPools':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # Tras un error (p. ej. un timeout) no se espera a las funciones que siguen en marcha
+        self.shutdown(wait=exc_type is None)
+
+@dataclass(frozen=True)
+class TaskOptions:
+    """
+    Opciones de ejecución de una tarea.
+
+    Van en un único argumento (options) para no chocar con los argumentos de la función:
+    dag.task("get", requests.get, url, timeout=10) pasa timeout a requests.get, mientras
+    que options=TaskOptions(timeout=10) limita el tiempo de la tarea.
+    """
+    # Mapea nombre de parámetro -> nombre de la tarea upstream cuyo resultado recibe.
+    # Sin mapeo explícito, el resultado se inyecta en el parámetro con el nombre de la tarea.
+    inputs: Dict[str, str] = field(default_factory=dict)
+    # Caché opcional de resultados y el código del que depende la función además del suyo
+    # (helpers, módulos o una cadena de versión): si cambia, la clave de caché también
+    cache: Optional[TaskCache] = None
+    cache_sources: Tuple[Any, ...] = ()
+    # Dónde se ejecuta la función síncrona: "inline" (event loop), "thread" o "process".
+    # None usa el executor por defecto de DAG.run
+    executor: Optional[str] = None
+    # Reintentos con backoff y tiempo máximo (segundos) de cada intento
+    retry: Optional[RetryPolicy] = None
+    timeout: Optional[float] = None
+
+    def __post_init__(self):
+        if self.executor is not None and self.executor not in EXECUTORS:
+            raise ValueError(f"Executor no soportado: {self.executor}")
+
 class Task:
-    def __init__(self, name: str, func: Callable, *args, **kwargs):
+    def __init__(self, name: str, func: Callable, /, *args, options: Optional[TaskOptions] = None, **kwargs):
+        options = options or TaskOptions()
         self.name = name
         self.func = func
         self.args = args
         self.kwargs = kwargs
+        self.inputs: Dict[str, str] = dict(options.inputs)
+        # Con caché, la huella del resultado es su clave
+        self.cache = options.cache
+        self.cache_sources = tuple(options.cache_sources)
+        self.result_fingerprint: Optional[str] = None
+        self.executor = options.executor
+        self.retry = options.retry
+        self.timeout = options.timeout
         self.upstream_tasks: Set[Task] = set()
         self.downstream_tasks: Set[Task] = set()
+        self.dag: Optional['DAG'] = None
+        self.metrics: Optional[TaskMetrics] = None
         self.logger = logging.getLogger(f"ETL.Task.{name}")
 
     def set_upstream(self, task: Union['Task', List['Task']]):
-        if isinstance(task, list):
-            for t in task:
-                self.upstream_tasks.add(t)
-                t.downstream_tasks.add(self)
-        else:
-            self.upstream_tasks.add(task)
-            task.downstream_tasks.add(self)
+        for t in (task if isinstance(task, list) else [task]):
+            self._add_edge(t, self)
         return self
 
     def set_downstream(self, task: Union['Task', List['Task']]):
-        if isinstance(task, list):
-            for t in task:
-                self.downstream_tasks.add(t)
-                t.upstream_tasks.add(self)
-        else:
-            self.downstream_tasks.add(task)
-            task.upstream_tasks.add(self)
+        for t in (task if isinstance(task, list) else [task]):
+            self._add_edge(self, t)
         return self
 
-    async def run(self) -> Any:
-        self.logger.info(f"Iniciando tarea '{self.name}'")
+    @staticmethod
+    def _add_edge(upstream: 'Task', downstream: 'Task') -> None:
+        # Validación estática: los errores aparecen al definir el DAG, no al ejecutarlo
+        if upstream.dag is not downstream.dag:
+            raise ValueError(f"Las tareas '{upstream.name}' y '{downstream.name}' pertenecen a DAGs distintos")
+        if upstream is downstream or Task._closes_cycle(upstream, downstream):
+            raise ValueError(f"Ciclo detectado en el DAG: '{downstream.name}' ya precede a '{upstream.name}'")
+
+        upstream.downstream_tasks.add(downstream)
+        downstream.upstream_tasks.add(upstream)
+        if upstream.dag is not None:
+            upstream.dag._execution_order = None
+
+    @staticmethod
+    def _closes_cycle(upstream: 'Task', downstream: 'Task') -> bool:
+        """
+        Indica si upstream ya es alcanzable desde downstream.
+
+        Se busca a la vez hacia delante desde downstream y hacia atrás desde upstream,
+        avanzando siempre por el lado con menos tareas vistas, y se para al agotarse uno
+        de los dos: añadir una arista sin descendientes o sin ancestros es O(1), así que
+        construir una cadena en cualquier orden sigue siendo lineal.
+        """
+        forward_seen, backward_seen = {downstream}, {upstream}
+        forward, backward = [downstream], [upstream]
+        while forward and backward:
+            if len(forward_seen) <= len(backward_seen):
+                stack, seen, other, neighbours = forward, forward_seen, backward_seen, "downstream_tasks"
+            else:
+                stack, seen, other, neighbours = backward, backward_seen, forward_seen, "upstream_tasks"
+            for task in getattr(stack.pop(), neighbours):
+                if task in other:
+                    return True
+                if task not in seen:
+                    seen.add(task)
+                    stack.append(task)
+        return False
+
+    def _accepts_param(self, param: str) -> bool:
+        try:
+            parameters = inspect.signature(self.func).parameters
+        except (TypeError, ValueError):
+            return False
+        return param in parameters or any(
+            p.kind is inspect.Parameter.VAR_KEYWORD for p in parameters.values()
+        )
+
+    def _upstream_kwargs(self, upstream_results: Dict[str, Any]) -> Dict[str, Any]:
+        mapping = dict(self.inputs)
+        mapped_tasks = set(mapping.values())
+        for dep in self.upstream_tasks:
+            if dep.name not in mapped_tasks and self._accepts_param(dep.name):
+                mapping[dep.name] = dep.name
+
+        missing = [name for name in mapping.values() if name not in upstream_results]
+        if missing:
+            raise ValueError(f"La tarea '{self.name}' espera resultados de tareas que no son upstream: {missing}")
+
+        return {param: upstream_results[name] for param, name in mapping.items()}
+
+    def _accepts_run_id(self) -> bool:
+        # Solo las funciones que declaran explícitamente run_id (no **kwargs)
+        try:
+            return "run_id" in inspect.signature(self.func).parameters
+        except (TypeError, ValueError):
+            return False
+
+    async def run(self, executor: Optional[Executor] = None,
+                  upstream_results: Optional[Dict[str, Any]] = None,
+                  upstream_fingerprints: Optional[Dict[str, str]] = None,
+                  attempt: int = 1, run_id: Optional[str] = None,
+                  submitted_at: Optional[float] = None) -> Any:
+        attempt_info = f" (intento {attempt}/{self.retry.max_attempts})" if self.retry and attempt > 1 else ""
+        self.logger.info(f"Iniciando tarea '{self.name}'{attempt_info}")
         start_time = time.time()
+        self.result_fingerprint = None
+        # submitted_at es cuándo el DAG lanzó la tarea (antes de esperar un hueco de
+        # concurrencia); sin él, la tarea cuenta como lanzada al empezar
+        submitted_at = submitted_at or start_time
+        self.metrics = TaskMetrics(task=self.name, executor=_executor_kind(self.func, executor),
+                                   submitted_at=submitted_at, started_at=start_time, attempt=attempt,
+                                   queue_wait_seconds=max(0.0, start_time - submitted_at))
 
         try:
-            if asyncio.iscoroutinefunction(self.func):
-                result = await self.func(*self.args, **self.kwargs)
+            cache_key = None
+            if self.cache is not None:
+                cache_key = self.cache.key(self.func, self.args, self.kwargs, upstream_fingerprints or {},
+                                           sources=self.cache_sources)
+                hit, result = self.cache.get(cache_key)
+                if hit:
+                    self.result_fingerprint = cache_key
+                    self._finish_metrics(result, cached=True)
+                    self.logger.info(f"Tarea '{self.name}' recuperada de caché en {self.metrics.wall_seconds:.2f} segundos")
+                    return result
+
+            upstream_kwargs = self._upstream_kwargs(upstream_results or {})
+            self.metrics.record_inputs(list(upstream_kwargs.values()))
+            kwargs = {**self.kwargs, **upstream_kwargs}
+            # El identificador de la ejecución no forma parte de la clave de caché
+            if run_id is not None and "run_id" not in kwargs and self._accepts_run_id():
+                kwargs["run_id"] = run_id
+            if self.timeout is None:
+                result = await self._call(executor, kwargs)
             else:
-                result = self.func(*self.args, **self.kwargs)
+                try:
+                    result = await asyncio.wait_for(self._call(executor, kwargs), self.timeout)
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"La tarea '{self.name}' superó el tiempo máximo de {self.timeout} segundos")
+
+            if cache_key is not None:
+                self.cache.put(cache_key, result)
+                self.result_fingerprint = cache_key
 
-            elapsed = time.time() - start_time
-            self.logger.info(f"Tarea '{self.name}' completada en {elapsed:.2f} segundos")
+            self._finish_metrics(result)
+            self.logger.info(f"Tarea '{self.name}' completada en {self.metrics.wall_seconds:.2f} segundos")
             return result
         except Exception as e:
-            elapsed = time.time() - start_time
-            self.logger.error(f"Error en tarea '{self.name}' después de {elapsed:.2f} segundos: {str(e)}")
+            self.metrics.status = "failed"
+            self.metrics.error = f"{type(e).__name__}: {e}"
+            self._finish_metrics(None)
+            self.logger.error(f"Error en tarea '{self.name}' después de {self.metrics.wall_seconds:.2f} segundos: {str(e)}")
             raise
 
+    async def _call(self, executor: Optional[Executor], kwargs: Dict[str, Any]) -> Any:
+        # Al vencer el timeout se cancela la espera; una función ya en marcha en un
+        # hilo o proceso no se puede interrumpir y termina en segundo plano
+        if asyncio.iscoroutinefunction(self.func):
+            return await self.func(*self.args, **kwargs)
+        if isinstance(executor, ProcessPoolExecutor):
+            # Los DataFrames viajan al proceso worker como Arrow IPC en memoria compartida
+            result, stats = await call_in_process(executor, self.func, self.args, kwargs)
+        elif executor is not None:
+            # Las funciones síncronas se ejecutan en el pool para no bloquear el event loop
+            loop = asyncio.get_running_loop()
+            result, stats = await loop.run_in_executor(executor, partial(measured_call, self.func, self.args, kwargs))
+        else:
+            result, stats = measured_call(self.func, self.args, kwargs)
+        self.metrics.record_call(stats)
+        return result
+
+    def _finish_metrics(self, result: Any, cached: bool = False) -> None:
+        self.metrics.finished_at = time.time()
+        self.metrics.wall_seconds = self.metrics.finished_at - self.metrics.submitted_at
+        self.metrics.cached = cached
+        if result is not None:
+            self.metrics.record_output(result)
+
+def _executor_kind(func: Callable, executor: Optional[Executor]) -> str:
+    if asyncio.iscoroutinefunction(func):
+        return "async"
+    if executor is None:
+        return "inline"
+    return "process" if isinstance(executor, ProcessPoolExecutor) else "thread"
+
 class DAG:
-    def __init__(self, dag_id: str, description: str = ""):
+    def __init__(self, dag_id: str, description: str = "", checkpoint_dir: Optional[Path] = None,
+                 keep_successful_runs: int = 0):
         self.dag_id = dag_id
         self.description = description
         self.tasks: Dict[str, Task] = {}
+        # Con checkpoint_dir, cada ejecución guarda estado y salidas para poder reanudarla.
+        # De las que terminan con éxito solo se conservan las keep_successful_runs más recientes
+        self.checkpoint_dir = checkpoint_dir
+        self.keep_successful_runs = keep_successful_runs
+        self.last_run_id: Optional[str] = None
+        self._execution_order: Optional[List[Task]] = None
+        self.last_report: Optional[RunReport] = None
         self.logger = logging.getLogger(f"ETL.DAG.{dag_id}")
 
-    def task(self, name: str, func: Callable, *args, **kwargs) -> Task:
-        task = Task(name, func, *args, **kwargs)
+    def task(self, name: str, func: Callable, /, *args, options: Optional[TaskOptions] = None, **kwargs) -> Task:
+        """Registra una tarea que llama a func(*args, **kwargs); sus opciones van en options"""
+        if name in self.tasks:
+            raise ValueError(f"Ya existe una tarea llamada '{name}' en el DAG '{self.dag_id}'")
+        task = Task(name, func, *args, options=options, **kwargs)
+        task.dag = self
         self.tasks[name] = task
+        self._execution_order = None
         return task
 
+    def script_task(self, name: str, script_path: str, *script_args: str,
+                    pool: Optional[ScriptPool] = None, options: Optional[TaskOptions] = None) -> Task:
+        """Tarea que ejecuta un script de Python, en un ScriptPool si se indica o en un subproceso nuevo"""
+        if pool is not None:
+            return self.task(name, pool.run_async, script_path, *script_args, options=options)
+        return self.task(name, run_script, script_path, *script_args, options=options)
+
     def get_execution_order(self) -> List[Task]:
-        remaining_tasks = list(self.tasks.values())
-        execution_order = []
+        """Orden topológico (algoritmo de Kahn), calculado una vez y reutilizado hasta que cambie el DAG"""
+        if self._execution_order is None:
+            self._execution_order = self._topological_sort()
+        return list(self._execution_order)
 
-        while remaining_tasks:
-            ready_tasks = [
-                task for task in remaining_tasks
-                if all(dep in execution_order for dep in task.upstream_tasks)
-            ]
+    def _topological_sort(self) -> List[Task]:
+        # El orden de registro desempata para que el resultado sea determinista
+        position = {task: i for i, task in enumerate(self.tasks.values())}
+        missing = sorted({
+            dep.name for task in position for dep in task.upstream_tasks if dep not in position
+        })
+        if missing:
+            self.logger.error(f"Dependencias no registradas en el DAG: {missing}")
+            raise ValueError(f"Dependencias no registradas en el DAG: {missing}")
 
-            if not ready_tasks and remaining_tasks:
-                cyclic_tasks = [t.name for t in remaining_tasks]
-                self.logger.error(f"Ciclo detectado entre tareas: {cyclic_tasks}")
-                raise ValueError("Ciclo detectado en el DAG")
+        in_degree = {task: len(task.upstream_tasks) for task in position}
+        ready = deque(task for task in position if in_degree[task] == 0)
+        execution_order = []
+
+        while ready:
+            task = ready.popleft()
+            execution_order.append(task)
+            for child in sorted(task.downstream_tasks, key=position.__getitem__):
+                in_degree[child] -= 1
+                if in_degree[child] == 0:
+                    ready.append(child)
 
-            execution_order.extend(ready_tasks)
-            for task in ready_tasks:
-                remaining_tasks.remove(task)
+        if len(execution_order) != len(position):
+            # Tareas en un ciclo o que dependen de uno
+            cyclic_tasks = [t.name for t in position if in_degree[t] > 0]
+            self.logger.error(f"Ciclo detectado entre tareas: {cyclic_tasks}")
+            raise ValueError(f"Ciclo detectado en el DAG entre las tareas: {cyclic_tasks[:10]}"
+                             + (" ..." if len(cyclic_tasks) > 10 else ""))
 
         return execution_order
 
-    async def run(self) -> Dict[str, Any]:
-        self.logger.info(f"Iniciando DAG '{self.dag_id}'")
+    async def run(self, mode: str = "sequential", max_concurrency: Optional[int] = None,
+                  executor: Optional[str] = None, keep_results: bool = False,
+                  run_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Ejecuta el DAG.
+
+        mode="sequential" ejecuta las tareas una a una en orden topológico.
+        mode="parallel" lanza cada tarea en cuanto terminan todas sus upstream_tasks,
+        con como máximo max_concurrency tareas simultáneas.
+
+        Las funciones síncronas se ejecutan según el executor de cada tarea ("inline",
+        "thread" o "process"); las tareas sin executor usan el de este método, que por
+        defecto es "inline" en modo secuencial y "thread" en modo paralelo.
+
+        Los resultados de cada tarea se inyectan en sus tareas downstream y se liberan
+        cuando termina el último consumidor. Se devuelven los resultados de las tareas
+        finales, o los de todas si keep_results=True.
+
+        Si el DAG tiene checkpoint_dir, las tareas ya completadas en la ejecución run_id
+        no se repiten (ver resume); al terminar con éxito se eliminan los checkpoints de
+        las ejecuciones con éxito más antiguas (keep_successful_runs). Las funciones con un parámetro run_id reciben el
+        identificador de la ejecución (run_id o uno nuevo).
+
+        El valor devuelto es un RunResult: un dict de resultados con el atributo report
+        (RunReport) con las métricas de cada tarea, exportable a JSON o Chrome trace.
+        """
+        if mode not in ("sequential", "parallel"):
+            raise ValueError(f"Modo de ejecución no soportado: {mode}")
+        default_executor = executor or ("thread" if mode == "parallel" else "inline")
+        if default_executor not in EXECUTORS:
+            raise ValueError(f"Executor no soportado: {executor}")
+
+        checkpoint = None
+        completed: Set[str] = set()
+        run_id = run_id or new_run_id()
+        self.last_run_id = run_id
+        if self.checkpoint_dir is not None:
+            checkpoint = RunCheckpoint(self.checkpoint_dir, run_id, self.dag_id)
+            completed = checkpoint.completed_tasks()
+
+        self.logger.info(f"Iniciando DAG '{self.dag_id}' en modo {mode}" + (f" (run_id={run_id})" if checkpoint else ""))
         start_time = time.time()
+        report = RunReport(dag_id=self.dag_id, run_id=run_id, started_at=start_time)
+        self.last_report = report
+
+        execution_order = [task for task in self.get_execution_order() if task.name not in completed]
+        store = ResultStore(keep_results=keep_results)
+        if completed:
+            self.logger.info(f"Reanudando ejecución '{run_id}'. Tareas ya completadas: {sorted(completed)}")
+            self._restore_completed(checkpoint, completed, execution_order, store)
 
-        execution_order = self.get_execution_order()
-        results = {}
+        max_workers = max_concurrency or min(32, (os.cpu_count() or 1) + 4)
 
         try:
-            for task in execution_order:
-                results[task.name] = await task.run()
+            with ExecutorPools(max_workers) as pools:
+                if mode == "parallel":
+                    await self._run_parallel(execution_order, store, checkpoint, report, pools,
+                                             default_executor, max_workers)
+                else:
+                    for task in execution_order:
+                        await self._run_task(task, store, checkpoint, report, pools, default_executor)
+            report.finished_at = time.time()
+            if checkpoint is not None:
+                checkpoint.mark_run_success()
+                RunCheckpoint.prune(self.checkpoint_dir, self.dag_id, keep=self.keep_successful_runs)
 
-            elapsed = time.time() - start_time
-            self.logger.info(f"DAG '{self.dag_id}' completado en {elapsed:.2f} segundos")
-            return results
+            elapsed = report.finished_at - start_time
+            self.logger.info(f"DAG '{self.dag_id}' completado en {elapsed:.2f} segundos\n{report.summary()}")
+            return RunResult(store.results, report)
         except Exception as e:
-            elapsed = time.time() - start_time
+            report.finished_at = time.time()
+            elapsed = report.finished_at - start_time
             self.logger.error(f"Error en DAG '{self.dag_id}' después de {elapsed:.2f} segundos: {str(e)}")
+            if checkpoint is not None:
+                self.logger.error(f"Para reanudar la ejecución use resume('{run_id}')")
             raise
 
-def run_script(script_path):
-    python_executable = sys.executable
-    env = os.environ.copy()
+    async def resume(self, run_id: str, **kwargs) -> Dict[str, Any]:
+        """Reanuda una ejecución fallida: solo repite las tareas no completadas y sus downstream"""
+        if self.checkpoint_dir is None:
+            raise ValueError(f"El DAG '{self.dag_id}' no tiene checkpoint_dir configurado")
+        if not (Path(self.checkpoint_dir) / run_id).exists():
+            raise FileNotFoundError(f"No existe la ejecución '{run_id}' en {self.checkpoint_dir}")
+        return await self.run(run_id=run_id, **kwargs)
+
+    def _restore_completed(self, checkpoint: RunCheckpoint, completed: Set[str],
+                           pending_tasks: List[Task], store: ResultStore) -> None:
+        # Solo se cargan las salidas que alguna tarea pendiente necesita
+        pending = set(pending_tasks)
+        for name in completed:
+            task = self.tasks[name]
+            consumers = len(task.downstream_tasks & pending)
+            if consumers:
+                store.put(task, checkpoint.load_output(name), checkpoint.fingerprint(name), consumers=consumers)
+
+    async def _run_task(self, task: Task, store: ResultStore, checkpoint: Optional[RunCheckpoint],
+                        report: RunReport, pools: ExecutorPools, default_executor: str,
+                        semaphore: Optional[asyncio.Semaphore] = None) -> None:
+        pool = pools.get(task.executor or default_executor)
+        if pool is None and task.timeout is not None and not asyncio.iscoroutinefunction(task.func):
+            # Una función síncrona en el event loop no se puede cortar: con timeout va a un hilo
+            pool = pools.get("thread")
+
+        attempt = 1
+        while True:
+            # La espera en el semáforo forma parte de la cola de la tarea
+            submitted_at = time.time()
+            try:
+                async with semaphore or _NO_LIMIT:
+                    result = await task.run(executor=pool, upstream_results=store.upstream_results(task),
+                                            upstream_fingerprints=store.upstream_fingerprints(task),
+                                            attempt=attempt, run_id=report.run_id, submitted_at=submitted_at)
+                break
+            except Exception as e:
+                if task.metrics is not None:
+                    report.add(task.metrics)
+                delay = task.retry.delay(attempt, e) if task.retry else None
+                if delay is None:
+                    if checkpoint is not None:
+                        checkpoint.mark_failed(task.name, e)
+                    raise
+                # La espera libera el hueco de concurrencia: las demás ramas siguen avanzando
+                self.logger.warning(f"Reintentando tarea '{task.name}' en {delay:.2f} segundos tras error: {e}")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        report.add(task.metrics)
+
+        if checkpoint is not None:
+            # La escritura de la salida va a un hilo para no bloquear las demás ramas del
+            # event loop; el estado (pequeño) se actualiza en el loop, sin condiciones de carrera
+            loop = asyncio.get_running_loop()
+            output = await loop.run_in_executor(None, checkpoint.save_output, task.name, result)
+            checkpoint.mark_success(task.name, output, task.result_fingerprint)
+        store.put(task, result, task.result_fingerprint)
+        store.release(task)
+
+    async def _run_parallel(self, execution_order: List[Task], store: ResultStore,
+                            checkpoint: Optional[RunCheckpoint], report: RunReport,
+                            pools: ExecutorPools, default_executor: str, max_workers: int) -> None:
+        semaphore = asyncio.Semaphore(max_workers)
+        futures: Dict[Task, asyncio.Future] = {}
 
-    if not os.path.exists(script_path):
-        local_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), script_path)
-        if os.path.exists(local_path):
-            script_path = local_path
+        async def run_when_ready(task: Task) -> None:
+            # Esperar a que terminen todas las dependencias antes de ocupar un hueco
+            upstream_futures = [futures[dep] for dep in task.upstream_tasks if dep in futures]
+            if upstream_futures:
+                await asyncio.gather(*upstream_futures)
+            await self._run_task(task, store, checkpoint, report, pools, default_executor, semaphore)
 
-    python_path = os.pathsep.join(sys.path)
-    if 'PYTHONPATH' in env:
-        env['PYTHONPATH'] = python_path + os.pathsep + env['PYTHONPATH']
-    else:
-        env['PYTHONPATH'] = python_path
+        if not execution_order:
+            return
+
+        # El orden topológico garantiza que las dependencias ya tienen su future
+        for task in execution_order:
+            futures[task] = asyncio.ensure_future(run_when_ready(task))
+
+        done, pending = await asyncio.wait(futures.values(), return_when=asyncio.FIRST_EXCEPTION)
+        failed = [f for f in done if not f.cancelled() and f.exception() is not None]
+        if failed:
+            for future in pending:
+                future.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise failed[0].exception()
+
+    def run_sync(self, **kwargs) -> Dict[str, Any]:
+        """Ejecuta el DAG desde código síncrono, incluso si ya hay un event loop activo (p. ej. Jupyter)"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.run(**kwargs))
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, self.run(**kwargs)).result()
+
+def run_script(script_path, *args: str, pool: Optional[ScriptPool] = None):
+    # Con un ScriptPool el script se ejecuta en un intérprete ya arrancado
+    if pool is not None:
+        return pool.run(script_path, *args)
+
+    python_executable = sys.executable
+    script_path = resolve_script_path(script_path)
 
     result = subprocess.run(
-        [python_executable, script_path],
+        [python_executable, script_path, *args],
         capture_output=True,
         text=True,
-        env=env
+        env=script_env()
     )
 
     if result.returncode != 0:
@@ -134,4 +577,4 @@ def run_script(script_path):
         logging.error(error_msg)
         raise RuntimeError(error_msg)
 
-    return result.stdout
\ No newline at end of file
+    return result.stdout
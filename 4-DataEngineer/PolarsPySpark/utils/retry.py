@@ -0,0 +1,32 @@
+# retry.py
+import random
+from dataclasses import dataclass
+from typing import Optional, Tuple, Type
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Política de reintentos de una tarea.
+
+    El intento n espera backoff * factor**(n-1) segundos (como máximo max_backoff) más
+    un jitter aleatorio de hasta jitter * ese valor, para que las tareas que fallan a la
+    vez no reintenten todas al mismo tiempo. Solo se reintentan las excepciones de retry_on.
+    """
+    max_attempts: int = 3
+    backoff: float = 1.0
+    factor: float = 2.0
+    max_backoff: float = 60.0
+    jitter: float = 0.5
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,)
+
+    def __post_init__(self):
+        if self.max_attempts < 1:
+            raise ValueError("max_attempts debe ser al menos 1")
+
+    def delay(self, attempt: int, error: BaseException) -> Optional[float]:
+        """Segundos de espera antes del siguiente intento, o None si no se debe reintentar"""
+        if attempt >= self.max_attempts or not isinstance(error, self.retry_on):
+            return None
+        delay = min(self.max_backoff, self.backoff * self.factor ** (attempt - 1))
+        return delay + random.uniform(0, self.jitter * delay)
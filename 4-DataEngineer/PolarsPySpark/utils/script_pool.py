@@ -0,0 +1,175 @@
+# script_pool.py
+import asyncio
+import itertools
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from .script_worker import END_MARKER
+
+WORKER_SCRIPT = Path(__file__).with_name("script_worker.py")
+DEFAULT_PRELOAD = ("polars", "sqlalchemy")
+
+logger = logging.getLogger("ETL.ScriptPool")
+
+
+def resolve_script_path(script_path: str) -> str:
+    if not os.path.exists(script_path):
+        local_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), script_path)
+        if os.path.exists(local_path):
+            return local_path
+    return script_path
+
+
+def script_env() -> dict:
+    """Entorno para los subprocesos: hereda el sys.path del proceso actual"""
+    env = os.environ.copy()
+    python_path = os.pathsep.join(sys.path)
+    if 'PYTHONPATH' in env:
+        env['PYTHONPATH'] = python_path + os.pathsep + env['PYTHONPATH']
+    else:
+        env['PYTHONPATH'] = python_path
+    return env
+
+
+def log_output(stream: str, line: str) -> None:
+    if stream == "stderr":
+        logger.warning(line)
+    else:
+        logger.info(line)
+
+
+class _Worker:
+    """Un intérprete precalentado con hilos que leen su stdout/stderr línea a línea"""
+
+    def __init__(self, preload: Sequence[str], env: dict):
+        self.process = subprocess.Popen(
+            [sys.executable, "-u", str(WORKER_SCRIPT), *preload],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            env=env,
+        )
+        self.lines: "queue.Queue[Tuple[str, Optional[str]]]" = queue.Queue()
+        for name, stream in (("stdout", self.process.stdout), ("stderr", self.process.stderr)):
+            threading.Thread(target=self._read, args=(name, stream), daemon=True).start()
+
+    def _read(self, name: str, stream) -> None:
+        for line in stream:
+            self.lines.put((name, line.rstrip("\n")))
+        self.lines.put((name, None))
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def close(self) -> None:
+        if self.alive():
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class ScriptPool:
+    """
+    Pool de intérpretes de Python precalentados para ejecutar scripts.
+
+    Cada worker importa una vez los módulos de preload (polars, sqlalchemy...) y
+    reutiliza el intérprete entre scripts, evitando el arranque y las importaciones
+    en cada llamada. La salida de los scripts se reenvía en vivo a on_output
+    (por defecto, al logger) y además se devuelve al terminar.
+
+    Los scripts comparten el intérprete del worker: los módulos importados por un
+    script siguen cargados para el siguiente.
+    """
+
+    def __init__(self, size: int = 2, preload: Sequence[str] = DEFAULT_PRELOAD,
+                 on_output: Callable[[str, str], None] = log_output):
+        self.preload = tuple(preload)
+        self.on_output = on_output
+        self._env = script_env()
+        self._ids = itertools.count()
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers: List[_Worker] = []
+        for _ in range(size):
+            self._add_worker()
+
+    def _add_worker(self) -> None:
+        worker = _Worker(self.preload, self._env)
+        self._workers.append(worker)
+        self._idle.put(worker)
+
+    def run(self, script_path: str, *args: str) -> str:
+        """Ejecuta un script en un worker libre y devuelve su stdout"""
+        script_path = resolve_script_path(script_path)
+        worker = self._idle.get()
+        try:
+            returncode, stdout, stderr = self._execute(worker, script_path, args)
+        finally:
+            if worker.alive():
+                self._idle.put(worker)
+            else:
+                # El script terminó el intérprete (p. ej. os._exit): se sustituye el worker
+                self._workers.remove(worker)
+                self._add_worker()
+
+        if returncode != 0:
+            error_msg = f"Error en script {script_path}:\n{stderr}"
+            logging.error(error_msg)
+            raise RuntimeError(error_msg)
+        return stdout
+
+    async def run_async(self, script_path: str, *args: str) -> str:
+        return await asyncio.to_thread(self.run, script_path, *args)
+
+    def _execute(self, worker: _Worker, script_path: str, args: Sequence[str]) -> Tuple[int, str, str]:
+        request_id = next(self._ids)
+        worker.process.stdin.write(json.dumps({"id": request_id, "script": script_path, "args": list(args)}) + "\n")
+        worker.process.stdin.flush()
+
+        output = {"stdout": [], "stderr": []}
+        finished = set()
+        returncode = 1
+        while len(finished) < 2:
+            stream, line = worker.lines.get()
+            if line is None:
+                # El worker murió antes de terminar el script
+                finished.add(stream)
+                returncode = worker.process.wait()
+                continue
+            if END_MARKER in line:
+                prefix, marker = line.split(END_MARKER, 1)
+                if stream == "stderr":
+                    returncode = int(marker.split()[1])
+                finished.add(stream)
+                line = prefix
+                if not line:
+                    continue
+            output[stream].append(line)
+            self.on_output(stream, line)
+
+        if returncode == 0 and not worker.alive():
+            returncode = 1
+        stdout = "".join(f"{line}\n" for line in output["stdout"])
+        stderr = "".join(f"{line}\n" for line in output["stderr"])
+        return returncode, stdout, stderr
+
+    def close(self) -> None:
+        for worker in self._workers:
+            worker.close()
+        self._workers.clear()
+
+    def __enter__(self) -> 'ScriptPool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
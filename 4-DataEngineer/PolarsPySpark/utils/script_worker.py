@@ -0,0 +1,65 @@
+# script_worker.py
+"""
+Intérprete precalentado para ScriptPool.
+
+Importa una sola vez los módulos pesados indicados en la línea de comandos y después
+ejecuta, uno tras otro, los scripts que recibe por stdin (una petición JSON por línea).
+La salida de cada script se escribe directamente en stdout/stderr, de modo que el
+proceso padre la recibe en vivo; al terminar se escribe un marcador en ambos flujos
+con el código de salida.
+
+Este fichero se ejecuta como script y no importa nada del paquete utils.
+"""
+import importlib
+import json
+import os
+import runpy
+import sys
+import traceback
+
+END_MARKER = "\x1e__ETL_SCRIPT_END__"
+
+
+def _run_script(script_path: str, args: list) -> int:
+    saved_argv, saved_path, saved_cwd = sys.argv, list(sys.path), os.getcwd()
+    sys.argv = [script_path, *args]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script_path)))
+    try:
+        runpy.run_path(script_path, run_name="__main__")
+        return 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException:
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.argv, sys.path[:] = saved_argv, saved_path
+        os.chdir(saved_cwd)
+
+
+def main() -> None:
+    for module in sys.argv[1:]:
+        importlib.import_module(module)
+
+    # Los scripts no deben leer del canal de peticiones
+    requests = sys.stdin
+    sys.stdin = open(os.devnull)
+
+    for line in requests:
+        request = json.loads(line)
+        code = _run_script(request["script"], request.get("args", []))
+        sys.stdout.flush()
+        sys.stderr.flush()
+        sys.stdout.write(f"{END_MARKER} {request['id']}\n")
+        sys.stdout.flush()
+        sys.stderr.write(f"{END_MARKER} {request['id']} {code}\n")
+        sys.stderr.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# shared_frames.py
+"""
+Transferencia de DataFrames entre procesos mediante Arrow IPC en memoria compartida.
+
+En lugar de serializar los DataFrames con pickle a través de la tubería del
+ProcessPoolExecutor, se escriben en formato Arrow IPC en un bloque de
+multiprocessing.shared_memory y solo viaja su nombre y tamaño.
+"""
+import asyncio
+import io
+import os
+from collections import deque
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from functools import partial
+from itertools import islice
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import polars as pl
+
+from .task_metrics import CallStats, measured_call
+
+
+@dataclass(frozen=True)
+class SharedFrame:
+    name: str
+    size: int
+
+
+def frame_to_shared(df: pl.DataFrame) -> SharedFrame:
+    buffer = io.BytesIO()
+    df.write_ipc(buffer)
+    data = buffer.getbuffer()
+    shm = SharedMemory(create=True, size=max(1, data.nbytes))
+    try:
+        shm.buf[:data.nbytes] = data
+    finally:
+        del data
+        shm.close()
+    return SharedFrame(shm.name, buffer.tell())
+
+
+def frame_from_shared(ref: SharedFrame, unlink: bool = False) -> pl.DataFrame:
+    shm = SharedMemory(name=ref.name)
+    try:
+        return pl.read_ipc(io.BytesIO(bytes(shm.buf[:ref.size])))
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+
+def release_shared(ref: SharedFrame) -> None:
+    try:
+        shm = SharedMemory(name=ref.name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _share(value: Any, refs: List[SharedFrame]) -> Any:
+    if isinstance(value, pl.DataFrame):
+        ref = frame_to_shared(value)
+        refs.append(ref)
+        return ref
+    return value
+
+
+def _unshare(value: Any) -> Any:
+    return frame_from_shared(value) if isinstance(value, SharedFrame) else value
+
+
+def _share_result(result: Any) -> Any:
+    # Los DataFrames del resultado (también dentro de una tupla) vuelven por memoria compartida
+    if isinstance(result, tuple):
+        return tuple(_share_result(item) for item in result)
+    return frame_to_shared(result) if isinstance(result, pl.DataFrame) else result
+
+
+def _unshare_result(result: Any) -> Any:
+    if isinstance(result, tuple):
+        return tuple(_unshare_result(item) for item in result)
+    return frame_from_shared(result, unlink=True) if isinstance(result, SharedFrame) else result
+
+
+def run_with_shared_frames(func: Callable, args: tuple, kwargs: Dict[str, Any]) -> Tuple[Any, CallStats]:
+    """Punto de entrada en el proceso worker: reconstruye los DataFrames y comparte el resultado"""
+    args = tuple(_unshare(a) for a in args)
+    kwargs = {k: _unshare(v) for k, v in kwargs.items()}
+    result, stats = measured_call(func, args, kwargs)
+    return _share_result(result), stats
+
+
+async def call_in_process(pool: Executor, func: Callable, args: tuple,
+                          kwargs: Dict[str, Any]) -> Tuple[Any, CallStats]:
+    """Ejecuta func en un ProcessPoolExecutor pasando los DataFrames por memoria compartida"""
+    refs: List[SharedFrame] = []
+    try:
+        shared_args = tuple(_share(a, refs) for a in args)
+        shared_kwargs = {k: _share(v, refs) for k, v in kwargs.items()}
+        loop = asyncio.get_running_loop()
+        result, stats = await loop.run_in_executor(
+            pool, partial(run_with_shared_frames, func, shared_args, shared_kwargs)
+        )
+    finally:
+        # Los bloques de entrada pertenecen al proceso padre
+        for ref in refs:
+            release_shared(ref)
+
+    return _unshare_result(result), stats
+
+
+def _release_result(result: Any) -> None:
+    # Bloques de un resultado que ya no se va a leer
+    if isinstance(result, tuple):
+        for item in result:
+            _release_result(item)
+    elif isinstance(result, SharedFrame):
+        release_shared(result)
+
+
+def _submit_shared(pool: Executor, func: Callable, frame: pl.DataFrame, kwargs: Dict[str, Any]) -> Future:
+    ref = frame_to_shared(frame)
+    try:
+        future = pool.submit(run_with_shared_frames, func, (ref,), kwargs)
+    except BaseException:
+        release_shared(ref)
+        raise
+    # El bloque de entrada se libera en cuanto termina (o se cancela) el shard
+    future.add_done_callback(lambda _: release_shared(ref))
+    return future
+
+
+def map_frames_in_process(pool: Executor, func: Callable, frames: Iterable[pl.DataFrame],
+                          max_in_flight: Optional[int] = None, **kwargs) -> Iterator[Any]:
+    """
+    Aplica func(frame, **kwargs) a cada DataFrame en el ProcessPoolExecutor, en paralelo.
+
+    Los DataFrames viajan por memoria compartida en ambos sentidos y los resultados se
+    devuelven a medida que están listos, en el orden de frames. Como mucho hay
+    max_in_flight shards en curso (por defecto uno por worker del pool): cada frame se
+    copia a memoria compartida justo antes de enviarlo, así que la memoria usada no
+    crece con el número de shards.
+    """
+    max_in_flight = max_in_flight or getattr(pool, "_max_workers", None) or os.cpu_count() or 1
+    frames = iter(frames)
+    in_flight: Deque[Future] = deque()
+    try:
+        while True:
+            for frame in islice(frames, max_in_flight - len(in_flight)):
+                in_flight.append(_submit_shared(pool, func, frame, kwargs))
+            if not in_flight:
+                return
+            result, _ = in_flight.popleft().result()
+            yield _unshare_result(result)
+    finally:
+        # Tras un error o si se deja de consumir: se cancela lo pendiente y se liberan los
+        # resultados que nadie va a leer
+        for future in in_flight:
+            future.cancel()
+        for future in in_flight:
+            if not future.cancelled() and future.exception() is None:
+                _release_result(future.result()[0])
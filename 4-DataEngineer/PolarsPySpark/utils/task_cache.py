@@ -0,0 +1,157 @@
+# task_cache.py
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import polars as pl
+
+logger = logging.getLogger("ETL.Cache")
+
+
+def fingerprint(value: Any, source_files: Iterable[Tuple] = ()) -> str:
+    """
+    Huella de contenido de un resultado, usada para encadenar claves de caché.
+
+    Un LazyFrame no contiene datos: su huella es el plan serializado más el estado de los
+    ficheros que recibió la tarea que lo produjo (source_files, ver input_files).
+    """
+    hasher = hashlib.sha256()
+    if isinstance(value, pl.DataFrame):
+        hasher.update(str(value.schema).encode())
+        hasher.update(value.hash_rows(seed=0).to_numpy().tobytes())
+    elif isinstance(value, pl.LazyFrame):
+        hasher.update(value.serialize())
+        hasher.update(repr(list(source_files)).encode())
+    else:
+        hasher.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    return hasher.hexdigest()
+
+
+def _function_source(func: Any) -> str:
+    # Funciones, clases o módulos; una cadena es una versión explícita del código
+    if isinstance(func, str):
+        return func
+    try:
+        return inspect.getsource(func)
+    except (OSError, TypeError):
+        return f"{getattr(func, '__module__', '')}.{getattr(func, '__qualname__', repr(func))}"
+
+
+def _file_state(value: Any) -> Optional[Tuple]:
+    # Los argumentos que apuntan a ficheros existentes invalidan la caché si cambian; en
+    # un directorio cuenta cada fichero que contiene
+    if isinstance(value, (str, Path)):
+        try:
+            path = Path(value)
+            if path.is_dir():
+                files = sorted(p for p in path.rglob("*") if p.is_file())
+                return (str(path.resolve()), tuple(_file_state(p) for p in files))
+            stat = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        return (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+    return None
+
+
+def input_files(func: Callable, args: tuple, kwargs: Dict[str, Any]) -> List[Tuple]:
+    """Estado de los ficheros a los que apuntan los argumentos de func, incluidos los valores por defecto"""
+    try:
+        bound = inspect.signature(func).bind_partial(*args, **kwargs)
+        bound.apply_defaults()
+        values = list(bound.arguments.values())
+    except (TypeError, ValueError):
+        values = [*args, *kwargs.values()]
+    return [f for f in (_file_state(v) for v in values) if f is not None]
+
+
+def save_value(path: Path, value: Any) -> Path:
+    """Guarda un valor en path (sin extensión): Arrow IPC para DataFrames, pickle para el resto"""
+    path = Path(path)
+    if isinstance(value, pl.DataFrame):
+        path = path.with_name(f"{path.name}.arrow")
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        value.write_ipc(tmp_path, compression="lz4")
+    else:
+        path = path.with_name(f"{path.name}.pkl")
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    # Escritura atómica: nunca queda un fichero a medias con el nombre final
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_value(path: Path) -> Any:
+    path = Path(path)
+    if path.suffix == ".arrow":
+        return pl.read_ipc(path)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+class TaskCache:
+    """
+    Caché en disco de resultados de tareas, direccionada por contenido.
+
+    La clave combina el código fuente de la función y de las fuentes adicionales de
+    las que depende (sources: helpers, módulos o una cadena de versión), sus argumentos,
+    las huellas de los resultados upstream y el mtime/tamaño de los ficheros de entrada. Los
+    DataFrames se guardan en Arrow IPC; el resto de valores con pickle. Al superar
+    max_bytes se eliminan las entradas usadas hace más tiempo (LRU).
+    """
+
+    def __init__(self, cache_dir: Path = Path(".etl_cache"), max_bytes: int = 2 * 1024 ** 3):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, func: Callable, args: tuple, kwargs: Dict[str, Any],
+            upstream_fingerprints: Dict[str, str], sources: Iterable[Any] = ()) -> str:
+        hasher = hashlib.sha256()
+        for source in (func, *sources):
+            hasher.update(_function_source(source).encode())
+        hasher.update(pickle.dumps((args, sorted(kwargs.items())), protocol=pickle.HIGHEST_PROTOCOL))
+        hasher.update(repr(sorted(upstream_fingerprints.items())).encode())
+        hasher.update(repr(input_files(func, args, kwargs)).encode())
+        return hasher.hexdigest()
+
+    def _entry(self, key: str) -> Optional[Path]:
+        for suffix in (".arrow", ".pkl"):
+            path = self.cache_dir / f"{key}{suffix}"
+            if path.exists():
+                return path
+        return None
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        path = self._entry(key)
+        if path is None:
+            return False, None
+
+        # Actualizar la fecha de acceso para la política LRU
+        os.utime(path)
+        return True, load_value(path)
+
+    def put(self, key: str, value: Any) -> None:
+        save_value(self.cache_dir / key, value)
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = [p for p in self.cache_dir.iterdir() if p.suffix in (".arrow", ".pkl")]
+        stats = {p: p.stat() for p in entries}
+        total = sum(s.st_size for s in stats.values())
+
+        for path in sorted(entries, key=lambda p: stats[p].st_mtime_ns):
+            if total <= self.max_bytes:
+                break
+            total -= stats[path].st_size
+            path.unlink(missing_ok=True)
+            logger.info(f"Entrada de caché eliminada por LRU: {path.name}")
+
+    def clear(self) -> None:
+        for path in self.cache_dir.iterdir():
+            if path.suffix in (".arrow", ".pkl", ".tmp"):
+                path.unlink(missing_ok=True)
@@ -0,0 +1,164 @@
+# task_metrics.py
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import polars as pl
+
+try:
+    import resource
+except ImportError:  # Windows no dispone del módulo resource
+    resource = None
+
+
+@dataclass
+class CallStats:
+    """Medidas tomadas en el hilo o proceso que ejecuta la función"""
+    started_at: float
+    cpu_seconds: Optional[float]
+    peak_rss_delta_bytes: Optional[int]
+    pid: int
+    thread_id: int
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measured_call(func: Callable, args: tuple, kwargs: Dict[str, Any]) -> Tuple[Any, CallStats]:
+    """
+    Ejecuta func midiendo el tiempo de CPU y el incremento del pico de RSS del proceso.
+
+    Se mide la CPU de todo el proceso para incluir los hilos internos de Polars; con
+    tareas concurrentes en hilos la cifra también incluye el trabajo de las demás.
+    """
+    started_at = time.time()
+    cpu_start = time.process_time()
+    rss_start = _peak_rss_bytes()
+
+    result = func(*args, **kwargs)
+
+    rss_end = _peak_rss_bytes()
+    stats = CallStats(
+        started_at=started_at,
+        cpu_seconds=time.process_time() - cpu_start,
+        peak_rss_delta_bytes=None if rss_start is None else rss_end - rss_start,
+        pid=os.getpid(),
+        thread_id=threading.get_ident(),
+    )
+    return result, stats
+
+
+def size_of(value: Any) -> Tuple[Optional[int], Optional[int]]:
+    """Filas y bytes aproximados de un valor intercambiado entre tareas"""
+    if isinstance(value, pl.DataFrame):
+        return value.height, value.estimated_size()
+    if isinstance(value, (list, tuple)):
+        return len(value), None
+    return None, None
+
+
+@dataclass
+class TaskMetrics:
+    task: str
+    executor: str
+    status: str = "success"
+    attempt: int = 1
+    cached: bool = False
+    submitted_at: float = 0.0
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    wall_seconds: float = 0.0
+    cpu_seconds: Optional[float] = None
+    queue_wait_seconds: float = 0.0
+    peak_rss_delta_bytes: Optional[int] = None
+    input_rows: Optional[int] = None
+    input_bytes: Optional[int] = None
+    output_rows: Optional[int] = None
+    output_bytes: Optional[int] = None
+    pid: int = field(default_factory=os.getpid)
+    thread_id: int = field(default_factory=threading.get_ident)
+    error: Optional[str] = None
+
+    def record_inputs(self, values: List[Any]) -> None:
+        sizes = [size_of(v) for v in values]
+        rows = [r for r, _ in sizes if r is not None]
+        nbytes = [b for _, b in sizes if b is not None]
+        self.input_rows = sum(rows) if rows else None
+        self.input_bytes = sum(nbytes) if nbytes else None
+
+    def record_output(self, value: Any) -> None:
+        self.output_rows, self.output_bytes = size_of(value)
+
+    def record_call(self, stats: CallStats) -> None:
+        self.started_at = stats.started_at
+        self.queue_wait_seconds = max(0.0, stats.started_at - self.submitted_at)
+        self.cpu_seconds = stats.cpu_seconds
+        self.peak_rss_delta_bytes = stats.peak_rss_delta_bytes
+        self.pid = stats.pid
+        self.thread_id = stats.thread_id
+
+
+@dataclass
+class RunReport:
+    """Métricas de todas las tareas de una ejecución del DAG"""
+    dag_id: str
+    run_id: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    tasks: List[TaskMetrics] = field(default_factory=list)
+
+    def add(self, metrics: TaskMetrics) -> None:
+        self.tasks.append(metrics)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def to_json(self, path: Optional[Path] = None) -> str:
+        content = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            Path(path).write_text(content, encoding="utf-8")
+        return content
+
+    def to_chrome_trace(self, path: Path) -> None:
+        """Exporta un fichero de eventos para chrome://tracing o https://ui.perfetto.dev"""
+        events = []
+        for m in self.tasks:
+            if m.queue_wait_seconds > 0:
+                events.append({
+                    "name": f"{m.task} (espera en cola)", "cat": "queue", "ph": "X",
+                    "ts": m.submitted_at * 1e6, "dur": m.queue_wait_seconds * 1e6,
+                    "pid": m.pid, "tid": m.thread_id,
+                })
+            events.append({
+                "name": m.task, "cat": m.executor, "ph": "X",
+                "ts": m.started_at * 1e6, "dur": (m.finished_at - m.started_at) * 1e6,
+                "pid": m.pid, "tid": m.thread_id,
+                "args": {k: v for k, v in asdict(m).items() if v is not None},
+            })
+        Path(path).write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf-8")
+
+    def summary(self) -> str:
+        lines = [f"{'tarea':<24} {'estado':<8} {'pared (s)':>10} {'cpu (s)':>9} {'cola (s)':>9} {'filas sal.':>11}"]
+        for m in sorted(self.tasks, key=lambda m: m.wall_seconds, reverse=True):
+            cpu = f"{m.cpu_seconds:.2f}" if m.cpu_seconds is not None else "-"
+            rows = m.output_rows if m.output_rows is not None else "-"
+            lines.append(f"{m.task:<24} {m.status:<8} {m.wall_seconds:>10.2f} {cpu:>9} {m.queue_wait_seconds:>9.2f} {rows:>11}")
+        return "\n".join(lines)
+
+
+class RunResult(dict):
+    """Resultados de DAG.run (por nombre de tarea) junto con el informe de métricas"""
+
+    def __init__(self, results: Dict[str, Any], report: RunReport):
+        super().__init__(results)
+        self.report = report
@@ -1,42 +1,320 @@
+import hashlib
+import json
 import logging
+import os
 import polars as pl
+import pyarrow.parquet
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
 )
 
+Schema = Dict[str, pl.DataType]
+
+# Nombre de partición Hive para claves nulas (Polars y Spark lo leen como null)
+HIVE_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _normalize_dtype(dtype: pl.DataType) -> pl.DataType:
+    # Todas las fechas se unifican a nanosegundos
+    if isinstance(dtype, pl.Datetime):
+        return pl.Datetime("ns", dtype.time_zone)
+    return dtype
+
+
+def _supertype(left: pl.DataType, right: pl.DataType) -> pl.DataType:
+    """Tipo común de una columna que cambia de tipo entre archivos"""
+    if left == right or right == pl.Null:
+        return left
+    if left == pl.Null:
+        return right
+    if isinstance(left, pl.Datetime) and isinstance(right, pl.Datetime):
+        return pl.Datetime("ns", left.time_zone)
+    if left.is_numeric() and right.is_numeric():
+        if left.is_float() or right.is_float():
+            return pl.Float64
+        return pl.Int64
+    return pl.String
+
+
 class ParquetMerger:
-    def __init__(self, input_folder: Path, output_file: Path):
+    def __init__(self, input_folder: Path, output_file: Path,
+                 compression: str = "zstd", compression_level: Optional[int] = None,
+                 row_group_size: Optional[int] = None,
+                 statistics: Union[bool, str, Dict[str, bool]] = True,
+                 statistics_columns: Optional[List[str]] = None,
+                 partition_column: str = "tpep_pickup_datetime"):
         self.input_folder = input_folder
         self.output_file = output_file
+        # Opciones de escritura comunes a todos los modos
+        self.compression = compression
+        self.compression_level = compression_level
+        self.row_group_size = row_group_size
+        self.statistics = statistics
+        # Columnas con estadísticas (None = todas). Polars solo elige qué estadísticas se
+        # escriben, no en qué columnas: con esta opción se escribe con pyarrow, lo que solo
+        # es posible en los modos que escriben DataFrames (no en streaming ni incremental)
+        self.statistics_columns = statistics_columns
+        # Columna fecha de la que salen year/month en el modo particionado
+        self.partition_column = partition_column
+        # Manifiesto de archivos ya unificados (solo en modo incremental)
+        self.manifest_file = output_file.with_name(f"{output_file.name}.manifest.json")
+
+    def _write_options(self) -> Dict[str, Any]:
+        return {
+            "compression": self.compression,
+            "compression_level": self.compression_level,
+            "row_group_size": self.row_group_size,
+            "statistics": self.statistics,
+        }
+
+    def _write_frame(self, df: pl.DataFrame, path: Path) -> None:
+        if self.statistics_columns is None:
+            df.write_parquet(path, **self._write_options())
+            return
+        pyarrow.parquet.write_table(
+            df.to_arrow(), path,
+            compression=None if self.compression == "uncompressed" else self.compression,
+            compression_level=self.compression_level,
+            row_group_size=self.row_group_size,
+            write_statistics=[col for col in self.statistics_columns if col in df.columns] if self.statistics else False,
+        )
 
     def _get_parquet_files(self) -> list[Path]:
         archivos = sorted(self.input_folder.glob("*.parquet"))
         logging.info(f"Archivos encontrados: {[f.name for f in archivos]}")
         return archivos
 
-    def merge(self) -> pl.DataFrame:
+    @staticmethod
+    def _read_schemas(archivos: list[Path]) -> List[Schema]:
+        # Solo se leen los footers de los archivos, en paralelo
+        with ThreadPoolExecutor(max_workers=min(32, len(archivos))) as pool:
+            return [dict(schema) for schema in pool.map(pl.read_parquet_schema, archivos)]
+
+    @staticmethod
+    def _reconcile_schemas(schemas: List[Schema]) -> Tuple[Schema, List[Dict[str, str]]]:
+        """
+        Calcula el esquema común de todos los archivos.
+
+        Las columnas se emparejan sin distinguir mayúsculas (Airport_fee y airport_fee son
+        la misma) y se nombran como en el primer archivo en que aparecen. Los tipos se
+        unifican con _supertype y los Datetime pasan a nanosegundos. Devuelve el esquema
+        destino y, por archivo, el renombrado de sus columnas.
+        """
+        canonical: Dict[str, str] = {}
+        target: Schema = {}
+        renames = []
+        for schema in schemas:
+            rename = {}
+            for col, dtype in schema.items():
+                name = canonical.setdefault(col.lower(), col)
+                if name != col:
+                    rename[col] = name
+                dtype = _normalize_dtype(dtype)
+                target[name] = _supertype(target[name], dtype) if name in target else dtype
+            renames.append(rename)
+        return target, renames
+
+    @staticmethod
+    def _aligned_scan(archivo: Path, schema: Schema, rename: Dict[str, str], target: Schema) -> pl.LazyFrame:
+        # Renombrado, casts y columnas ausentes en un único plan perezoso por archivo
+        lf = pl.scan_parquet(archivo)
+        if rename:
+            lf = lf.rename(rename)
+        present = {rename.get(col, col): dtype for col, dtype in schema.items()}
+        columns = [
+            (pl.col(col) if present[col] == dtype else pl.col(col).cast(dtype)) if col in present
+            else pl.lit(None, dtype=dtype).alias(col)
+            for col, dtype in target.items()
+        ]
+        return lf.select(columns)
+
+    def _aligned_scans(self, archivos: list[Path]) -> Tuple[Schema, List[pl.LazyFrame]]:
+        schemas = self._read_schemas(archivos)
+        target, renames = self._reconcile_schemas(schemas)
+        drift = [
+            archivo.name for archivo, schema, rename in zip(archivos, schemas, renames)
+            if {rename.get(col, col): _normalize_dtype(dtype) for col, dtype in schema.items()} != target
+        ]
+        if drift:
+            logging.info(f"Archivos con esquema distinto al común (se reconcilian): {drift}")
+        scans = [self._aligned_scan(a, schema, rename, target) for a, schema, rename in zip(archivos, schemas, renames)]
+        return target, scans
+
+    @staticmethod
+    def _file_entry(archivo: Path) -> Dict[str, Any]:
+        stat = archivo.stat()
+        schema = pl.read_parquet_schema(archivo)
+        return {
+            "path": str(archivo.resolve()),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "rows": pl.scan_parquet(archivo).select(pl.len()).collect().item(),
+            "schema_hash": hashlib.sha256(str(schema).encode()).hexdigest(),
+        }
+
+    def _load_manifest(self) -> Tuple[Dict[str, Dict[str, Any]], Optional[str]]:
+        if not self.manifest_file.exists():
+            return {}, None
+        manifest = json.loads(self.manifest_file.read_text(encoding="utf-8"))
+        return manifest["files"], manifest.get("target_schema_hash")
+
+    def _save_manifest(self, files: Dict[str, Dict[str, Any]], target_schema_hash: str) -> None:
+        tmp_file = self.manifest_file.with_name(f"{self.manifest_file.name}.tmp")
+        content = {"target_schema_hash": target_schema_hash, "files": files}
+        tmp_file.write_text(json.dumps(content, indent=2), encoding="utf-8")
+        os.replace(tmp_file, self.manifest_file)
+
+    def _merge_incremental(self, archivos: list[Path]) -> None:
+        """
+        Mantiene output_file como un directorio con un archivo parquet por cada archivo
+        de entrada. Solo se escriben las partes de archivos nuevos o modificados (según
+        tamaño y mtime) y se eliminan las de archivos que ya no existen.
+        """
+        if self.output_file.is_file():
+            raise ValueError(
+                f"{self.output_file} es un archivo unificado completo; elimínelo para usar el modo incremental"
+            )
+        self.output_file.mkdir(parents=True, exist_ok=True)
+
+        manifest, target_hash = self._load_manifest()
+        current = {archivo.name: archivo for archivo in archivos}
+        target, scans = self._aligned_scans(archivos)
+        scan_by_name = dict(zip(current, scans))
+
+        for name in sorted(set(manifest) - set(current)):
+            (self.output_file / name).unlink(missing_ok=True)
+            del manifest[name]
+            logging.info(f"Eliminada la parte de un archivo que ya no existe: {name}")
+
+        # Si el esquema común cambia (p. ej. un mes nuevo trae otra columna) se reescriben todas las partes
+        new_target_hash = hashlib.sha256(str(target).encode()).hexdigest()
+        if target_hash is not None and target_hash != new_target_hash:
+            logging.info("El esquema común ha cambiado: se reescriben todas las partes")
+            manifest = {}
+
+        pending = []
+        for name, archivo in current.items():
+            stat = archivo.stat()
+            previous = manifest.get(name)
+            if previous is None or previous["size"] != stat.st_size or previous["mtime_ns"] != stat.st_mtime_ns:
+                pending.append(archivo)
+
+        logging.info(f"Archivos nuevos o modificados: {[a.name for a in pending]} "
+                     f"({len(current) - len(pending)} sin cambios)")
+
+        for archivo in pending:
+            part = self.output_file / archivo.name
+            tmp_part = part.with_name(f".{part.name}.tmp")
+            scan_by_name[archivo.name].sink_parquet(tmp_part, **self._write_options())
+            os.replace(tmp_part, part)
+            manifest[archivo.name] = self._file_entry(archivo)
+            # Guardar tras cada parte para no repetirla si falla la siguiente
+            self._save_manifest(manifest, new_target_hash)
+
+        self._save_manifest(manifest, new_target_hash)
+
+    def _resolve_partition_column(self, target: Schema) -> str:
+        by_lower = {col.lower(): col for col in target}
+        column = by_lower.get(self.partition_column.lower())
+        if column is None or not isinstance(target[column], pl.Datetime):
+            raise ValueError(f"No existe una columna de fecha '{self.partition_column}' para particionar")
+        return column
+
+    def _merge_partitioned(self, archivos: list[Path]) -> None:
+        """
+        Escribe output_file como un dataset Hive (year=YYYY/month=M/part-NNNNN.parquet)
+        según partition_column. Cada archivo de entrada se lee una sola vez y sus filas se
+        reparten entre las particiones a las que pertenecen (una parte por archivo y
+        partición), ordenadas por esa columna para que las estadísticas de los row groups
+        permitan descartarlos al filtrar por fecha. En memoria solo está un archivo a la vez.
+        """
+        target, scans = self._aligned_scans(archivos)
+        column = self._resolve_partition_column(target)
+
+        # Se escribe en un directorio temporal y se sustituye al terminar
+        tmp_dir = self.output_file.with_name(f".{self.output_file.name}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        for index, (archivo, scan) in enumerate(zip(archivos, scans)):
+            df = (
+                scan.sort(column, nulls_last=True)
+                .with_columns(pl.col(column).dt.year().alias("year"), pl.col(column).dt.month().alias("month"))
+                .collect()
+            )
+            groups = df.partition_by("year", "month", as_dict=True, include_key=False)
+            for (year, month), group in groups.items():
+                part_dir = (tmp_dir / f"year={HIVE_NULL_PARTITION if year is None else year}"
+                            / f"month={HIVE_NULL_PARTITION if month is None else month}")
+                part_dir.mkdir(parents=True, exist_ok=True)
+                self._write_frame(group, part_dir / f"part-{index:05d}.parquet")
+            logging.info(f"{archivo.name} repartido en {len(groups)} particiones")
+            del df, groups
+
+        if self.output_file.is_dir():
+            shutil.rmtree(self.output_file)
+        elif self.output_file.exists():
+            self.output_file.unlink()
+        os.replace(tmp_dir, self.output_file)
+
+    def merge(self, streaming: bool = False, return_df: Optional[bool] = None,
+              incremental: bool = False, partitioned: bool = False) -> Optional[pl.DataFrame]:
+        """
+        Unifica los archivos parquet de input_folder en output_file.
+
+        Con streaming=True los archivos se leen de forma perezosa (scan_parquet) y se
+        escriben con sink_parquet, sin cargar el dataset completo en memoria. En ese modo
+        no se devuelve el DataFrame salvo que se pida con return_df=True.
+
+        Con incremental=True output_file pasa a ser un directorio de partes (legible con
+        pl.scan_parquet) y solo se procesan los archivos nuevos o modificados desde la
+        última ejecución, según el manifiesto guardado junto a la salida.
+
+        Con partitioned=True output_file pasa a ser un dataset particionado por año y mes
+        de partition_column, para que los lectores (pl.scan_parquet con
+        hive_partitioning=True) descarten particiones y row groups al filtrar.
+        """
         archivos = self._get_parquet_files()
         if not archivos:
             raise FileNotFoundError(f"No se encontraron archivos .parquet en {self.input_folder.resolve()}")
 
+        if incremental and partitioned:
+            raise ValueError("Los modos incremental y particionado no se pueden combinar")
+        if self.statistics_columns is not None and not partitioned and (streaming or incremental):
+            raise ValueError("statistics_columns solo se admite en los modos particionado y en memoria")
+        if return_df is None:
+            return_df = not (streaming or incremental or partitioned)
+
+        if partitioned:
+            logging.info(f"Unificando {len(archivos)} archivos parquet en particiones año/mes...")
+            self.output_file.parent.mkdir(parents=True, exist_ok=True)
+            self._merge_partitioned(archivos)
+            logging.info(f"Dataset particionado guardado en: {self.output_file}")
+            return pl.read_parquet(self.output_file, hive_partitioning=True) if return_df else None
+
+        if incremental:
+            self._merge_incremental(archivos)
+            logging.info(f"Dataset incremental actualizado en: {self.output_file}")
+            return pl.read_parquet(self.output_file) if return_df else None
+
         logging.info(f"Unificando {len(archivos)} archivos parquet...")
+        self.output_file.parent.mkdir(parents=True, exist_ok=True)
+
+        _, scans = self._aligned_scans(archivos)
 
-        dataframes = []
-        for archivo in archivos:
-            df = pl.read_parquet(archivo)
-            # Normalizar columnas datetime a la misma resolución
-            for col in df.columns:
-                if df[col].dtype == pl.Datetime("us") or df[col].dtype == pl.Datetime("ms") or df[col].dtype == pl.Datetime("ns"):
-                    df = df.with_columns(
-                        df[col].cast(pl.Datetime("ns"))
-                    )
-            dataframes.append(df)
+        if streaming:
+            pl.concat(scans).sink_parquet(self.output_file, **self._write_options())
+            logging.info(f"Archivo unificado guardado en: {self.output_file}")
+            return pl.read_parquet(self.output_file) if return_df else None
+
+        # collect_all ejecuta las lecturas de todos los archivos en paralelo en el pool de Polars
+        dataframes = pl.collect_all(scans)
 
         df_final = pl.concat(dataframes)
-        self.output_file.parent.mkdir(parents=True, exist_ok=True)
-        df_final.write_parquet(self.output_file)
+        self._write_frame(df_final, self.output_file)
         logging.info(f"Archivo unificado guardado en: {self.output_file}")
-        return df_final
+        return df_final if return_df else None